@@ -8,7 +8,7 @@ import tempfile
 from config import TEMP_DIR
 from services import generate_text, generate_speech, generate_image, transcribe_audio, convert_to_srt, create_video, add_subtitles, upload_media,cleanup_temp_file, cleanup_temp_files, generate_text_with_wikipedia
 from typing import Literal
-import json 
+import orjson
 import re
 from starlette.background import BackgroundTasks
 
@@ -18,7 +18,7 @@ router = APIRouter(prefix="/media", tags=["Media Generation"])
 async def generate_text_endpoint(model: Literal["deepseek", "gemini"] = Form(...), prompt: str = Form(...)):
     """Generate text from a prompt with Wikipedia sources"""
     try: 
-        generation_result = generate_text_with_wikipedia(model, prompt)
+        generation_result = await generate_text_with_wikipedia(model, prompt)
         
         # Handle both old and new response formats for backward compatibility
         if isinstance(generation_result, dict):
@@ -34,7 +34,7 @@ async def generate_text_endpoint(model: Literal["deepseek", "gemini"] = Form(...
         # Dùng regex để trích nội dung JSON từ giữa các dấu ```
         json_text = re.search(r"```(?:json)?\s*(\{.*?\})\s*```",  generated_text, re.DOTALL)
         if json_text:
-            parsed_data = json.loads(json_text.group(1))
+            parsed_data = orjson.loads(json_text.group(1))
         else:
             raise ValueError("Không tìm thấy JSON hợp lệ trong response.")   
         
@@ -52,7 +52,7 @@ async def text_to_speech( background_tasks: BackgroundTasks,text: str = Form(...
     """Convert text to speech"""
     output_file = os.path.join(TEMP_DIR, f"{uuid4()}.wav")
     try:
-        result_file = generate_speech(text, output_file, voice)
+        result_file = await generate_speech(text, output_file, voice)
         background_tasks.add_task(cleanup_temp_file, output_file)
         return FileResponse(result_file, media_type="audio/wav", filename="speech.wav")
     except Exception as e:
@@ -71,7 +71,7 @@ async def generate_image_endpoint(background_tasks: BackgroundTasks,
     """Generate image from text prompt"""
     output_file = os.path.join(TEMP_DIR, f"{uuid4()}.png")
     try:
-        result_file = generate_image(model, prompt,style, output_file)
+        result_file = await generate_image(model, prompt,style, output_file)
         background_tasks.add_task(cleanup_temp_file, output_file)
         return FileResponse(result_file, media_type="image/png", filename="image.png")
     except Exception as e:
@@ -89,11 +89,11 @@ async def transcribe_audio_endpoint(file: UploadFile = File(...), script: Option
     try:
         if create_srt:
             srt_file = os.path.join(TEMP_DIR, f"{uuid4()}.srt")
-            transcription = transcribe_audio(audio_file = temp_file, output_srt = srt_file, script=script)
+            transcription = await transcribe_audio(audio_file = temp_file, output_srt = srt_file, script=script)
             return FileResponse(srt_file, media_type="text/plain", filename="transcription.srt")
             
         else:
-            transcription = transcribe_audio(aduio_file = temp_file, script=script)
+            transcription = await transcribe_audio(aduio_file = temp_file, script=script)
 
             return {"srt": transcription}
     except Exception as e:
@@ -126,7 +126,7 @@ async def create_video_endpoint(
         # Create SRT file
         srt_file = os.path.join(TEMP_DIR, f"{uuid4()}.srt")
         temp_files.append(srt_file)
-        transcription = transcribe_audio(temp_audio, srt_file, script)
+        transcription = await transcribe_audio(temp_audio, srt_file, script)
 
         # Create video
         output_video = os.path.join(TEMP_DIR, f"{uuid4()}.mp4")
@@ -1,8 +1,10 @@
 from fastapi import APIRouter,Depends,HTTPException,status,Form,Query
+from fastapi.responses import StreamingResponse
 from schemas import VideoUpLoadRequest,VideoStatsResponse,GoogleVideoStatsResponse,FacebookVideoStatsResponse
 from models import User
 from api.deps import get_current_user
 from services.SocialNetwork import upload_video,get_video_stats,get_more_info_social_networks,get_social_videos,get_top_video
+from services.SocialNetwork.UploadJobs import start_upload_job,iter_upload_job_events
 from services.Media.media_utils import check_media_of_user
 from typing import Union,Optional
 from schemas import SocialPlatform
@@ -24,6 +26,25 @@ async def upload_video_to_social(upload_request: VideoUpLoadRequest=Form(...), u
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to upload video: {str(e)}"
         ) 
+
+@router.post("/upload-video/jobs",response_model=dict)
+async def start_upload_video_job(upload_request: VideoUpLoadRequest=Form(...), user: User = Depends(get_current_user)):
+    """Start the upload in the background; follow it at /social/upload-video/jobs/{job_id}"""
+    return {"job_id": start_upload_job(user, upload_request)}
+
+@router.get("/upload-video/jobs/{job_id}")
+async def follow_upload_video_job(job_id: str, user: User = Depends(get_current_user)):
+    """Server-sent events with the job's status, ending with its result or error"""
+    events = iter_upload_job_events(user, job_id)
+    # Resolve the job before streaming so an unknown id is a plain 404
+    first_event = await anext(events)
+
+    async def stream():
+        yield first_event
+        async for event in events:
+            yield event
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
     
 @router.get("/video-stats",response_model=Union[GoogleVideoStatsResponse,FacebookVideoStatsResponse])
 async def get_video_statstic(user:User =Depends(get_current_user),platform:str="",video_id:str="",page_id:Optional[str]=None):
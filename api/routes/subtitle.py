@@ -56,7 +56,7 @@ async def generate_subtitles_endpoint(
             f.write(content)
         
         # Generate subtitles
-        subtitle_data = generate_subtitles_from_audio(
+        subtitle_data = await generate_subtitles_from_audio(
             temp_audio, 
             language, 
             max_words_per_segment
@@ -225,7 +225,7 @@ async def create_complete_video(
                         print(f"🎵 Audio file for transcription: {audio_path}")
                         print(f"� Subtitle style: {request.subtitle_style}")
                         
-                        subtitle_data = generate_subtitles_from_audio(
+                        subtitle_data = await generate_subtitles_from_audio(
                             audio_path, 
                             language="auto"  # Auto-detect language from audio
                         )
@@ -470,7 +470,7 @@ async def create_video_from_components(
                     print("🎤 Generating subtitles from audio transcription...")
                     try:
                         # Always generate subtitles from audio transcription
-                        subtitle_data = generate_subtitles_from_audio(
+                        subtitle_data = await generate_subtitles_from_audio(
                             audio_path, 
                             language="auto"  # Auto-detect language from audio
                         )
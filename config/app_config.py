@@ -30,6 +30,12 @@ FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 FACEBOOK_APP_ID =os.getenv("FACEBOOK_APP_ID")
 FACEBOOK_APP_SECRET=os.getenv("FACEBOOK_APP_SECRET")
 FACEBOOK_REDIRECT_URI=os.getenv("FACEBOOK_REDIRECT_URI","http://localhost:3000")
+# Maximum number of Graph API requests in flight at once
+FB_GRAPH_CONCURRENCY = int(os.getenv("FB_GRAPH_CONCURRENCY", "25"))
 TIKTOK_CLIENT_KEY = os.getenv("TIKTOK_CLIENT_KEY")
 TIKTOK_CLIENT_SECRET = os.getenv("TIKTOK_CLIENT_SECRET")
 TIKTOK_REDIRECT_URI = os.getenv("TIKTOK_REDIRECT_URI")
+# YouTube resumable upload chunk size in bytes; Google requires a multiple of 256 KiB
+YT_UPLOAD_CHUNK_SIZE = int(os.getenv("YT_UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+if YT_UPLOAD_CHUNK_SIZE <= 0 or YT_UPLOAD_CHUNK_SIZE % (256 * 1024):
+    raise ValueError("YT_UPLOAD_CHUNK_SIZE must be a positive multiple of 262144 (256 KiB)")
@@ -0,0 +1,13 @@
+import asyncio
+
+try:
+    import uvloop
+except ImportError:  # uvloop is not available on Windows
+    uvloop = None
+
+def run_async(coro):
+    """Run a coroutine to completion on uvloop when installed, falling back to asyncio"""
+    if uvloop is None:
+        return asyncio.run(coro)
+    with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+        return runner.run(coro)
@@ -0,0 +1,18 @@
+import asyncio
+from typing import Dict, Hashable
+
+def keyed_lock(locks: Dict[Hashable, asyncio.Lock], key: Hashable, max_size: int) -> asyncio.Lock:
+    """
+    Get or create the lock for key in a bounded dict of per-key locks
+
+    When the dict is full the oldest lock that nobody holds is evicted; held locks are never
+    dropped, so callers queued on one keep sharing it
+    """
+    lock = locks.get(key)
+    if lock is None:
+        if len(locks) >= max_size:
+            idle_key = next((k for k, existing in locks.items() if not existing.locked()), None)
+            if idle_key is not None:
+                locks.pop(idle_key)
+        lock = locks[key] = asyncio.Lock()
+    return lock
@@ -2,9 +2,9 @@
 Script to seed trending topics database
 Run this script to populate the database with initial trending topics data
 """
-import asyncio
 from services.trending_topics import seed_trending_topics
 from config.mongodb_config import test_connection
+from core.event_loop import run_async
 
 async def main():
     print("Testing MongoDB connection...")
@@ -19,4 +19,4 @@ async def main():
     print("Seeding completed!")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run_async(main())
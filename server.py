@@ -19,6 +19,12 @@ import time
 import logging
 from contextlib import asynccontextmanager
 from config import test_connection
+from core.event_loop import uvloop
+from services.Media.wikipedia_service import close_http_client as close_wikipedia_client
+from services.SocialNetwork.Facebook import close_graph_client
+from services.SocialNetwork.TikTok import close_tiktok_client
+from services.SocialNetwork.Youtube import close_youtube_client
+from services.SocialNetwork.SocialUtils import ensure_social_indexes
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -28,7 +34,12 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app:FastAPI):
     await test_connection()
+    await ensure_social_indexes()
     yield
+    await close_wikipedia_client()
+    await close_graph_client()
+    await close_tiktok_client()
+    await close_youtube_client()
 
 api = FastAPI(
     title="Media Processing API",
@@ -109,6 +120,8 @@ if __name__ == "__main__":
         host="127.0.0.1", 
         port=8000, 
         reload=True,
+        # libuv-based event loop for the I/O-heavy upload and social API paths (not available on Windows)
+        loop="uvloop" if uvloop is not None else "asyncio",
         # Increase limits for video uploads
         limit_max_requests=1000,
         limit_concurrency=100,
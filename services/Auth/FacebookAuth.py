@@ -2,6 +2,7 @@ from fastapi import HTTPException,status
 from config import user_collection,app_config
 from models import User
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Dict, Any, Optional
 from services import get_user_by_email
 from .auth_utils import generate_username, generate_password
@@ -20,6 +21,11 @@ FACEBOOK_SCOPES=[
     "pages_show_list"
 ]
 collection = user_collection()
+
+# One pooled session for all Facebook calls, so each request reuses a warm TLS connection
+_fb_session = requests.Session()
+_fb_session.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=50))
+
 async def get_facebook_oauth_url():
     base_url = "https://www.facebook.com/v23.0/dialog/oauth"
     params = {
@@ -40,7 +46,7 @@ async def handle_facebook_oauth_callback(code: str)->User:
             "client_secret": FACEBOOK_APP_SECRET,
             "code": code
         }
-        token_response = requests.get(token_url, params=token_params)
+        token_response = _fb_session.get(token_url, params=token_params)
         token_data = token_response.json()
         if "error" in token_data:
             raise HTTPException(
@@ -53,7 +59,7 @@ async def handle_facebook_oauth_callback(code: str)->User:
             "fields": "name,email,picture",
             "access_token": access_token
         }
-        user_response = requests.get(user_info_url, params=user_info_params)
+        user_response = _fb_session.get(user_info_url, params=user_info_params)
         user_data = user_response.json()
         if "error" in user_data:
             raise HTTPException(
@@ -77,7 +83,7 @@ async def get_long_lived_token(short_token:str)->str:
         "client_secret": FACEBOOK_APP_SECRET,
         "fb_exchange_token": short_token
     }
-    response = requests.get(url, params=params)
+    response = _fb_session.get(url, params=params)
     data = response.json()
     if "error" in data:
         return short_token
@@ -146,7 +152,7 @@ async def get_user_pages(access_token:str)->list:
         "access_token": access_token,
         "fields": "id,name,access_token"
     }
-    response = requests.get(url, params=params)
+    response = _fb_session.get(url, params=params)
     data = response.json()
     if "error" in data:
         raise HTTPException(
@@ -168,7 +174,7 @@ async def check_facebook_credentials(user: User) -> str:
         "input_token": access_token,
         "access_token": f"{FACEBOOK_APP_ID}|{FACEBOOK_APP_SECRET}"
     }
-    response = requests.get(debug_url, params=params)
+    response = _fb_session.get(debug_url, params=params)
     valid_data = response.json()
     if "error" in valid_data or not valid_data.get("data", {}).get("is_valid"):
         raise HTTPException(
@@ -189,7 +195,7 @@ async def handle_facebook_callback(code: str, current_user: Optional[User] = Non
             "client_secret": FACEBOOK_APP_SECRET,
             "code": code
         }
-        token_response = requests.get(token_url, params=token_params)
+        token_response = _fb_session.get(token_url, params=token_params)
         token_data = token_response.json()
         
         if "error" in token_data:
@@ -206,7 +212,7 @@ async def handle_facebook_callback(code: str, current_user: Optional[User] = Non
             "fields": "name,email,picture,id",
             "access_token": access_token
         }
-        user_response = requests.get(user_info_url, params=user_info_params)
+        user_response = _fb_session.get(user_info_url, params=user_info_params)
         user_data = user_response.json()
         
         if "error" in user_data:
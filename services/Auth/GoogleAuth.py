@@ -18,6 +18,8 @@ from googleapiclient.discovery import build
 from google.oauth2.credentials import Credentials
 from typing import Optional
 from bson import ObjectId
+import asyncio
+from core.locks import keyed_lock
 GOOGLE_CLIENT_ID = app_config.GOOGLE_CLIENT_ID
 GOOGLE_CLIENT_SECRET = app_config.GOOGLE_CLIENT_SECRET
 GOOGLE_REDIRECT_URI = app_config.GOOGLE_REDIRECT_URI
@@ -141,6 +143,16 @@ async def process_google_user(idinfo:Dict[str,Any],credentials) ->User:
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Server error while creating user"
             )
+# Credentials refreshed by this process, keyed by user id; the stored user documents keep the
+# expired token until they are reloaded, so later calls reuse these instead of refreshing again
+_REFRESHED_CREDENTIALS_CACHE_SIZE = 2048
+_refreshed_google_credentials: Dict[str, Credentials] = {}
+_google_refresh_locks: Dict[str, asyncio.Lock] = {}
+
+def forget_google_credentials(user:User):
+    """Stop reusing this user's refreshed credentials after Google rejects them"""
+    _refreshed_google_credentials.pop(str(user.id), None)
+
 async def check_and_refresh_google_credentials(user:User) -> Credentials:
         if not user.social_credentials or 'google' not in user.social_credentials:
            raise HTTPException(
@@ -150,23 +162,35 @@ async def check_and_refresh_google_credentials(user:User) -> Credentials:
         google_credentials=user.social_credentials['google']['credentials']
         credentials =Credentials.from_authorized_user_info(google_credentials)
         if credentials.expired and credentials.refresh_token:
-            try:
-                credentials.refresh(Request())
-                updated_creds =credentials.to_json()
-                await collection.update_one(
-                    {"_id": user.id},
-                    {"$set": {"social_credentials.google.credentials": json.loads(updated_creds)}}
-                )
-            except RefreshError as e:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Google credentials error: {str(e)}"
-                )
-            except Exception as e:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Server error: {str(e)}"
-                )
+            user_key = str(user.id)
+            refreshed = _refreshed_google_credentials.get(user_key)
+            if refreshed is not None and not refreshed.expired:
+                return refreshed
+            async with keyed_lock(_google_refresh_locks, user_key, _REFRESHED_CREDENTIALS_CACHE_SIZE):
+                refreshed = _refreshed_google_credentials.get(user_key)
+                if refreshed is not None and not refreshed.expired:
+                    return refreshed
+                try:
+                    credentials.refresh(Request())
+                    updated_creds =credentials.to_json()
+                    await collection.update_one(
+                        {"_id": user.id},
+                        {"$set": {"social_credentials.google.credentials": json.loads(updated_creds)}}
+                    )
+                    _refreshed_google_credentials.pop(user_key, None)
+                    if len(_refreshed_google_credentials) >= _REFRESHED_CREDENTIALS_CACHE_SIZE:
+                        _refreshed_google_credentials.pop(next(iter(_refreshed_google_credentials)))
+                    _refreshed_google_credentials[user_key] = credentials
+                except RefreshError as e:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"Google credentials error: {str(e)}"
+                    )
+                except Exception as e:
+                    raise HTTPException(
+                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        detail=f"Server error: {str(e)}"
+                    )
         return credentials
 
 async def handle_google_callback(code: str, current_user: Optional[User] = None) -> User:
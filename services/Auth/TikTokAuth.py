@@ -9,6 +9,8 @@ from fastapi import HTTPException,status
 from models import User
 from services import get_user_by_tiktok_open_id,generate_username,generate_password,hash_password,get_user_by_username
 from datetime import datetime
+import asyncio
+from core.locks import keyed_lock
 from urllib.parse import urlencode
 from bson import ObjectId
 TIKTOK_CLIENT_KEY = app_config.TIKTOK_CLIENT_KEY
@@ -181,6 +183,15 @@ async def process_tiktok_user(user_data: Dict[str, Any], access_token: str,refre
                 detail="Server error while creating user"
             )
         
+# Access tokens refreshed by this process, keyed by user id: (access_token, expires_at timestamp)
+_REFRESHED_TOKEN_CACHE_SIZE = 2048
+_refreshed_tiktok_tokens: Dict[str, tuple] = {}
+_tiktok_refresh_locks: Dict[str, asyncio.Lock] = {}
+
+def forget_tiktok_token(user:User):
+    """Stop reusing this user's refreshed token after TikTok rejects it"""
+    _refreshed_tiktok_tokens.pop(str(user.id), None)
+
 async def check_and_refresh_tiktok_credentials(user:User)->str:
     if not user.social_credentials or 'tiktok' not in user.social_credentials:
         raise HTTPException(
@@ -203,35 +214,50 @@ async def check_and_refresh_tiktok_credentials(user:User)->str:
         current_time = datetime.now().timestamp()
         token_expired = current_time >= expiry_time
         if token_expired:
-            try:
-                new_tokens = await refresh_tiktok_token(refresh_token)
-                new_access_token = new_tokens.get("access_token")
-                new_refresh_token = new_tokens.get("refresh_token")
-                new_expires_in = new_tokens.get("expires_in")
-                if not new_access_token or not new_refresh_token or not new_expires_in:
+            # The user loaded for this request still holds the expired token; reuse a refresh another
+            # call already made rather than refreshing (and rotating the refresh token) again
+            user_key = str(user.id)
+            refreshed = _refreshed_tiktok_tokens.get(user_key)
+            if refreshed is not None and refreshed[1] > current_time:
+                return refreshed[0]
+            async with keyed_lock(_tiktok_refresh_locks, user_key, _REFRESHED_TOKEN_CACHE_SIZE):
+                refreshed = _refreshed_tiktok_tokens.get(user_key)
+                if refreshed is not None and refreshed[1] > datetime.now().timestamp():
+                    return refreshed[0]
+                try:
+                    new_tokens = await refresh_tiktok_token(refresh_token)
+                    new_access_token = new_tokens.get("access_token")
+                    new_refresh_token = new_tokens.get("refresh_token")
+                    new_expires_in = new_tokens.get("expires_in")
+                    if not new_access_token or not new_refresh_token or not new_expires_in:
+                        raise HTTPException(
+                            status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Failed to refresh TikTok token"
+                        )
+                    update_tiktok_credentials={
+                        **tiktok_credentials,
+                        "access_token": new_access_token,
+                        "refresh_token": new_refresh_token,
+                        "expires_in": new_expires_in,
+                        "token_created_at": datetime.now().timestamp()
+                    }
+                    social_credentials = user.social_credentials.copy()
+                    social_credentials['tiktok'] = update_tiktok_credentials
+                    await collection.update_one(
+                        {"_id": user.id},
+                        {"$set": {"social_credentials": social_credentials}}
+                    )
+                    # Stop reusing it a minute early so it never goes out expired
+                    _refreshed_tiktok_tokens.pop(user_key, None)
+                    if len(_refreshed_tiktok_tokens) >= _REFRESHED_TOKEN_CACHE_SIZE:
+                        _refreshed_tiktok_tokens.pop(next(iter(_refreshed_tiktok_tokens)))
+                    _refreshed_tiktok_tokens[user_key] = (new_access_token, datetime.now().timestamp() + new_expires_in - 60)
+                    return new_access_token
+                except Exception as e:  
                     raise HTTPException(
                         status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="Failed to refresh TikTok token"
+                        detail=f"Failed to refresh TikTok token: {str(e)}"
                     )
-                update_tiktok_credentials={
-                    **tiktok_credentials,
-                    "access_token": new_access_token,
-                    "refresh_token": new_refresh_token,
-                    "expires_in": new_expires_in,
-                    "token_created_at": datetime.now().timestamp()
-                }
-                social_credentials = user.social_credentials.copy()
-                social_credentials['tiktok'] = update_tiktok_credentials
-                await collection.update_one(
-                    {"_id": user.id},
-                    {"$set": {"social_credentials": social_credentials}}
-                )
-                return new_access_token
-            except Exception as e:  
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Failed to refresh TikTok token: {str(e)}"
-                )
     else:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -1,27 +1,29 @@
 import subprocess
 import imageio_ffmpeg
 import os
+import asyncio
 import tempfile 
 from config import TEMP_DIR
 import cloudinary
 import cloudinary.uploader
 from datetime import datetime, timedelta
-from typing import Optional, Dict
+from typing import Optional, Dict, Union, Tuple, AsyncIterator
 from config import media_collection
 from models.media import MediaModel, MediaType
 from bson import ObjectId
 from io import BytesIO
 import httpx
+from contextlib import asynccontextmanager
 
 media_colt = media_collection()
 ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
-async def upload_media(file_path: str, user_id: str, folder: str = "media", resource_type: str = "auto", 
+async def upload_media(file_path: Union[str, bytes], user_id: str, folder: str = "media", resource_type: str = "auto", 
                  prompt: str = None, metadata: Dict = None, quality: str = "high", title: str = None) -> Dict:
     """
     Upload media to Cloudinary and save metadata to MongoDB
     
     Args:
-        file_path: Path to local file
+        file_path: Path to local file, or the file's contents as bytes
         user_id: ID of the user uploading the media
         folder: Cloudinary folder
         resource_type: auto, image, video, raw
@@ -33,7 +35,7 @@ async def upload_media(file_path: str, user_id: str, folder: str = "media", reso
     """
     # Get filename for the prompt if not provided
     if not prompt:
-        prompt = os.path.basename(file_path)
+        prompt = os.path.basename(file_path) if isinstance(file_path, str) else "Untitled"
     
     # Upload to Cloudinary with high quality settings
     try:
@@ -85,11 +87,13 @@ async def upload_media(file_path: str, user_id: str, folder: str = "media", reso
             
             print(f"Using {quality} quality settings for video upload: {selected_quality}")
         
-        upload_result = cloudinary.uploader.upload(
-            file_path,
+        # The Cloudinary SDK is blocking; run the upload off the event loop
+        upload_result = await asyncio.to_thread(
+            cloudinary.uploader.upload,
+            BytesIO(file_path) if isinstance(file_path, bytes) else file_path,
             **upload_options
         )
-        print(f"Uploaded {file_path} to Cloudinary with high quality settings")
+        print(f"Uploaded {file_path if isinstance(file_path, str) else 'in-memory file'} to Cloudinary with high quality settings")
     except Exception as e:
         raise Exception(f"Failed to upload media to Cloudinary: {str(e)}")
 
@@ -466,6 +470,58 @@ async def download_video_media_from_cloud(media_id:str) ->BytesIO|None:
     except Exception as e:
         return None
 
+@asynccontextmanager
+async def open_video_media_stream(media_id:str):
+    """
+    Open a video from cloud storage as a streaming response, without buffering it
+    
+    Yields the httpx response (headers available, body not yet read), or None if the media doesn't exist
+    """
+    media = await get_media_by_id(media_id)
+    if not media or not media.get("url"):
+        yield None
+        return
+    async with httpx.AsyncClient() as client:
+        async with client.stream("GET", media.get("url")) as response:
+            response.raise_for_status()
+            yield response
+
+async def get_media_stream_size(media_response: httpx.Response) -> Tuple[int, Optional[memoryview]]:
+    """
+    Size of an opened media stream, for uploads that need it up front
+    
+    Returns (size, buffer). Content-Length is only trusted when the body isn't re-encoded; otherwise the
+    body is read into buffer. buffer is None while the body is unread and can still be streamed
+    """
+    content_length = media_response.headers.get("content-length")
+    if content_length is not None and media_response.headers.get("content-encoding", "identity") == "identity":
+        return int(content_length), None
+    buffer = memoryview(await media_response.aread())
+    return buffer.nbytes, buffer
+
+def iter_media_stream_chunks(media_response: httpx.Response, buffer: Optional[memoryview], chunk_size: int) -> AsyncIterator[bytes]:
+    """Chunks of an opened media stream (the last one may be shorter), streamed unless it was read into buffer"""
+    if buffer is None:
+        return _iter_chunks(media_response.aiter_bytes(), chunk_size)
+    return _iter_buffer_chunks(buffer, chunk_size)
+
+async def _iter_chunks(byte_stream: AsyncIterator[bytes], chunk_size: int) -> AsyncIterator[bytes]:
+    """Regroup a downloaded byte stream into chunk_size pieces (the last one may be shorter)"""
+    pending = bytearray()
+    async for data in byte_stream:
+        pending += data
+        while len(pending) >= chunk_size:
+            yield bytes(pending[:chunk_size])
+            del pending[:chunk_size]
+    if pending:
+        yield bytes(pending)
+
+async def _iter_buffer_chunks(buffer: memoryview, chunk_size: int) -> AsyncIterator[bytes]:
+    """Chunks of an in-memory video; slicing the memoryview doesn't duplicate the payload"""
+    for start_byte in range(0, buffer.nbytes, chunk_size):
+        # httpx treats a memoryview as an iterable of ints, so copy just this chunk
+        yield bytes(buffer[start_byte:start_byte + chunk_size])
+
 def create_multi_scene_video(image_paths, audio_path, output_path=None, 
                            min_scene_duration=3.0, max_scene_duration=8.0, 
                            transition_duration=0.5, enable_transitions=True):
@@ -962,9 +1018,10 @@ def cleanup_temp_file(file_path: str):
         file_path: Path to the file to delete
     """
     try:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            print(f"Cleaned up temp file: {file_path}")
+        os.remove(file_path)
+        print(f"Cleaned up temp file: {file_path}")
+    except FileNotFoundError:
+        pass
     except Exception as e:
         print(f"Error cleaning up temp file {file_path}: {e}")
 
@@ -0,0 +1,8 @@
+import asyncio
+
+# Maximum number of in-flight requests per AI provider.
+# Free tiers reject bursts with 429s, so fan-out from the video pipeline
+# (script -> image prompts -> images + speech) is queued here instead.
+OPENROUTER_LIMIT = asyncio.Semaphore(4)
+GEMINI_LIMIT = asyncio.Semaphore(8)
+TOGETHER_LIMIT = asyncio.Semaphore(2)
@@ -9,6 +9,7 @@ from io import BytesIO
 import base64
 from IPython.display import display
 import re
+from .provider_limits import GEMINI_LIMIT
 
 def get_prompt(script="NOT_PROVIDED", language="en"):
     language_instruction = {
@@ -52,17 +53,18 @@ Focus on:
 - Precise millisecond timing
     """
 
-def transcribe_audio(audio_file, output_srt=None, script="NOT_PROVIDED", language="en"):
+async def transcribe_audio(audio_file, output_srt=None, script="NOT_PROVIDED", language="en"):
     """Transcribe audio to SRT format using Gemini API and optionally create SRT file"""
     client = genai.Client(api_key=GEMINI_KEY)
 
-    myfile = client.files.upload(file=audio_file)
+    myfile = await client.aio.files.upload(file=audio_file)
     prompt = get_prompt(script, language)
 
-    response = client.models.generate_content(
-        model='gemini-1.5-flash',
-        contents=[prompt, myfile]
-    )
+    async with GEMINI_LIMIT:
+        response = await client.aio.models.generate_content(
+            model='gemini-1.5-flash',
+            contents=[prompt, myfile]
+        )
 
     # Dùng regex để trích nội dung JSON từ giữa các dấu ```
     match = re.search(r"```srt\s*(.*?)\s*```", response.text, re.DOTALL)
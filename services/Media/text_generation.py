@@ -1,33 +1,26 @@
-def get_prompt(prompt, wikipedia_context="") -> str:
-    context_section = ""
-    if wikipedia_context:
-        context_section = f"""
+import asyncio
+from openai import AsyncOpenAI
+from google import genai
+from config import GEMINI_KEY, OPENROUTER_KEY
+from .provider_limits import GEMINI_LIMIT, OPENROUTER_LIMIT
+from .wikipedia_service import WikipediaService
+
+_WIKI_BLOCK = """
 
 ADDITIONAL CONTEXT FROM WIKIPEDIA:
-{wikipedia_context}
+{wiki}
 
 Use this information to make your content more accurate and informative, but keep it concise for a 60-second video.
 """
-    
-    # Extract style tags if present in the prompt
-    style_section = ""
-    if "Style:" in prompt:
-        try:
-            style_content = prompt.split("Style:")[1].strip()
-            if style_content:
-                style_section = f"""
+
+_STYLE_BLOCK = """
 
 STYLE INSTRUCTIONS:
-Write the script in the following style: {style_content}
+Write the script in the following style: {style}
 Make sure the tone, vocabulary, and presentation match these style requirements.
 """
-                # Remove the style part from the main prompt to avoid redundancy
-                prompt = prompt.split("Style:")[0].strip()
-        except:
-            # In case of parsing error, continue without style
-            pass
-    
-    return (f"""
+
+_PROMPT_TEMPLATE = """
 You are a content generator for short-form videos under 60 seconds.
 
 Given a single user prompt in any language, you must:
@@ -35,7 +28,7 @@ Given a single user prompt in any language, you must:
 2. Write the video **title** and **script** in the same language as the user prompt, should be either English or Vietnamese
 3. Write exactly 3 **image generation prompts** in English that visually illustrate key moments of the script
 
-The script should be short and engaging, and take no more than 60 seconds to read aloud (maximum ~120 words).{context_section}{style_section}
+The script should be short and engaging, and take no more than 60 seconds to read aloud (maximum ~120 words).{context}{style}
 
 Return the result strictly in the following JSON format:
 {{
@@ -49,59 +42,104 @@ Return the result strictly in the following JSON format:
 }}
 
 User prompt: {prompt}
-""")
+"""
 
-def generate_text(model, prompt):
+def get_prompt(prompt, wikipedia_context="") -> str:
+    # Extract style tags if present in the prompt
+    style_section = ""
+    if "Style:" in prompt:
+        main_prompt, _, style_content = prompt.partition("Style:")
+        style_content = style_content.strip()
+        if style_content:
+            style_section = _STYLE_BLOCK.format(style=style_content)
+            # Remove the style part from the main prompt to avoid redundancy
+            prompt = main_prompt.strip()
+
+    return _PROMPT_TEMPLATE.format(
+        context=_WIKI_BLOCK.format(wiki=wikipedia_context) if wikipedia_context else "",
+        style=style_section,
+        prompt=prompt,
+    )
+
+# Token budgets for Wikipedia context; the lead article gets priority
+_WIKI_CONTEXT_TOKEN_BUDGET = 600
+_WIKI_LEAD_TOKEN_BUDGET = 500
+# Stop adding sections once fewer tokens than this remain
+_MIN_SECTION_TOKENS = 40
+# Generate without Wikipedia context if the lookup takes longer than this
+_WIKIPEDIA_TIMEOUT_SECONDS = 5.0
+
+def _estimate_tokens(text: str) -> int:
+    """Approximate token count (~0.75 words per token for English/Vietnamese text)"""
+    return (len(text.split()) * 4 + 2) // 3
+
+def _truncate_wikipedia_context(content: str, token_budget: int = _WIKI_CONTEXT_TOKEN_BUDGET,
+                               lead_budget: int = _WIKI_LEAD_TOKEN_BUDGET) -> str:
+    """
+    Trim Wikipedia content to a token budget, keeping whole sections where possible
+    and cutting the last one on a word boundary
+    """
+    kept = []
+    remaining = token_budget
+    for index, section in enumerate(part.strip() for part in content.split("\n\n")):
+        if not section:
+            continue
+        budget = min(remaining, lead_budget) if index == 0 else remaining
+        if budget < _MIN_SECTION_TOKENS:
+            break
+        tokens = _estimate_tokens(section)
+        if tokens > budget:
+            words = section.split()
+            kept.append(" ".join(words[:budget * 3 // 4]) + "...")
+            break
+        kept.append(section)
+        remaining -= tokens
+    return "\n\n".join(kept)
+
+async def generate_text(model, prompt):
     if (model=="deepseek"):
-        from openai import OpenAI
-        from config import OPENROUTER_KEY
-
         # Initialize the OpenAI client
-        client = OpenAI(
+        client = AsyncOpenAI(
             base_url="https://openrouter.ai/api/v1",
             api_key=OPENROUTER_KEY,
         )
         
         # Generate text using the OpenAI API
-        completion = client.chat.completions.create(
-            extra_body={},
-            model="deepseek/deepseek-chat-v3-0324:free",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": get_prompt(prompt),
-                        },
-                    ]    
-                }
-            ],
-        )
+        async with OPENROUTER_LIMIT:
+            completion = await client.chat.completions.create(
+                extra_body={},
+                model="deepseek/deepseek-chat-v3-0324:free",
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": get_prompt(prompt),
+                            },
+                        ]    
+                    }
+                ],
+            )
         return completion.choices[0].message.content
     
     elif (model=="gemini"):
-        from google import genai
-        from config import GEMINI_KEY
-        from google.genai import types
-
         client = genai.Client(api_key=GEMINI_KEY)
 
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=[get_prompt(prompt)],  
-        )
+        async with GEMINI_LIMIT:
+            response = await client.aio.models.generate_content(
+                model="gemini-2.0-flash",
+                contents=[get_prompt(prompt)],  
+            )
         return response.text
 
-def generate_text_with_wikipedia(model, prompt):
+async def generate_text_with_wikipedia(model, prompt):
     """
     Generate text with Wikipedia context integration
     """
     # Initialize Wikipedia service and get relevant content
-    from .wikipedia_service import WikipediaService
-    
     wiki_service = WikipediaService()
-    keywords = wiki_service.extract_keywords_with_ai(prompt, model)  # Pass model parameter
+    keywords = await wiki_service.extract_keywords_with_ai(prompt, model)  # Pass model parameter
     
     # Get Wikipedia content for the most relevant keyword
     wikipedia_data = None
@@ -110,38 +148,43 @@ def generate_text_with_wikipedia(model, prompt):
     if keywords:
         # Try to get Wikipedia content for the first keyword
         main_keyword = keywords[0]
-        wikipedia_data = wiki_service.get_relevant_content(main_keyword, max_articles=2, model=model)  # Pass model parameter
+        try:
+            # Wikipedia only enriches the script, so don't let a slow lookup hold up generation
+            wikipedia_data = await asyncio.wait_for(
+                wiki_service.get_relevant_content(main_keyword, max_articles=2, model=model),
+                timeout=_WIKIPEDIA_TIMEOUT_SECONDS,
+            )
+        except asyncio.TimeoutError:
+            print(f"Wikipedia lookup for '{main_keyword}' timed out, generating without context")
         
         if wikipedia_data and wikipedia_data.get('combined_content'):
             # Truncate context to avoid making prompt too long
-            wikipedia_context = wikipedia_data['combined_content'][:800] + "..." if len(wikipedia_data['combined_content']) > 800 else wikipedia_data['combined_content']
+            wikipedia_context = _truncate_wikipedia_context(wikipedia_data['combined_content'])
     
     if (model=="deepseek"):
-        from openai import OpenAI
-        from config import OPENROUTER_KEY
-
         # Initialize the OpenAI client
-        client = OpenAI(
+        client = AsyncOpenAI(
             base_url="https://openrouter.ai/api/v1",
             api_key=OPENROUTER_KEY,
         )
         
         # Generate text using the OpenAI API with Wikipedia context
-        completion = client.chat.completions.create(
-            extra_body={},
-            model="deepseek/deepseek-chat-v3-0324:free",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": get_prompt(prompt, wikipedia_context),
-                        },
-                    ]    
-                }
-            ],
-        )
+        async with OPENROUTER_LIMIT:
+            completion = await client.chat.completions.create(
+                extra_body={},
+                model="deepseek/deepseek-chat-v3-0324:free",
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": get_prompt(prompt, wikipedia_context),
+                            },
+                        ]    
+                    }
+                ],
+            )
         generated_content = completion.choices[0].message.content
         
         # Return both generated content and Wikipedia sources
@@ -152,16 +195,13 @@ def generate_text_with_wikipedia(model, prompt):
         }
     
     elif (model=="gemini"):
-        from google import genai
-        from config import GEMINI_KEY
-        from google.genai import types
-
         client = genai.Client(api_key=GEMINI_KEY)
 
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=[get_prompt(prompt, wikipedia_context)],  
-        )
+        async with GEMINI_LIMIT:
+            response = await client.aio.models.generate_content(
+                model="gemini-2.0-flash",
+                contents=[get_prompt(prompt, wikipedia_context)],  
+            )
         
         # Return both generated content and Wikipedia sources
         return {
@@ -169,55 +209,3 @@ def generate_text_with_wikipedia(model, prompt):
             "wikipedia_sources": wikipedia_data.get('sources', []) if wikipedia_data else [],
             "wikipedia_topic": main_keyword if keywords else None
         }
-
-def generate_image_prompts_from_script(script_text: str, count: int = 3) -> list:
-    """
-    Generate image prompts from script text for background generation
-    """
-    try:
-        import json
-        
-        prompt = f"""
-You are an expert at creating visual prompts for AI image generation.
-
-Given a video script, generate {count} distinct image prompts in English that would make good background scenes for this video.
-
-Each prompt should:
-1. Describe a visual scene that complements the script content
-2. Be detailed enough for AI image generation
-3. Focus on backgrounds/environments rather than characters
-4. Be visually distinct from each other
-
-Return the result strictly in JSON format:
-{{
-  "image_prompts": [
-    "prompt 1",
-    "prompt 2", 
-    "prompt 3"
-  ]
-}}
-
-Script: {script_text}
-"""
-        
-        # Use the existing generate_text function with deepseek model
-        response = generate_text("deepseek", prompt)
-        
-        # Handle the new response format
-        if isinstance(response, dict):
-            response_content = response.get('content', '')
-        else:
-            response_content = response
-        
-        # Parse the JSON response
-        result = json.loads(response_content)
-        return result.get("image_prompts", [])
-        
-    except Exception as e:
-        print(f"Error generating image prompts from script: {e}")
-        # Fallback: return simple prompts based on script keywords
-        return [
-            f"Background scene for: {script_text[:50]}...",
-            f"Environment setting for: {script_text[:50]}...",
-            f"Visual backdrop for: {script_text[:50]}..."
-        ][:count]
@@ -1,17 +1,20 @@
 from google import genai
-from google.genai import types
+from google.genai import errors, types
+import httpx
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
 import wave
 from config import GEMINI_KEY, TEMP_DIR
+from .provider_limits import GEMINI_LIMIT
 import os
 import asyncio
-from datetime import datetime
+import time
 import hashlib
 
 # Cache for deduplication
 _audio_cache = {}
 
 # Available voices from Gemini API (based on the image provided)
-AVAILABLE_VOICES = [
+AVAILABLE_VOICES = frozenset({
     "Zephyr", "Puck", "Charon", 
     "Kore", "Fenrir", "Leda", 
     "Orus", "Aoede", "Callirrhoe", 
@@ -22,7 +25,7 @@ AVAILABLE_VOICES = [
     "Schedar", "Gacrux", "Pulcherrima", 
     "Achird", "Zubenelgenubi", "Vindematrix", 
     "Sadachbia", "Sadaltager", "Sulafat"
-]
+})
 
 # Default fallback voice
 DEFAULT_VOICE = "Kore"
@@ -35,17 +38,22 @@ def wave_file(filename, pcm, channels=1, rate=24000, sample_width=2):
         wf.setframerate(rate)
         wf.writeframes(pcm)
 
-def generate_speech(text, output_file="speech.wav", voice="Kore"):
-    """Generate speech from text using Gemini API"""
-    client = genai.Client(api_key=GEMINI_KEY)
-    
-    # Use Kore as fallback if voice not in available list
-    if voice not in AVAILABLE_VOICES:
-        print(f"Voice '{voice}' not available. Using {DEFAULT_VOICE} as fallback.")
-        voice = DEFAULT_VOICE
-    
-    try:
-        response = client.models.generate_content(
+def _is_transient_error(error):
+    """Rate limits, server errors and dropped connections are worth retrying"""
+    if isinstance(error, (errors.ServerError, httpx.TransportError)):
+        return True
+    return isinstance(error, errors.ClientError) and error.code == 429
+
+@retry(
+    stop=stop_after_attempt(4),
+    wait=wait_random_exponential(min=1, max=16),
+    retry=retry_if_exception(_is_transient_error),
+    reraise=True,
+)
+async def _call_tts(client, text, voice):
+    """Call the Gemini TTS model and return the raw PCM audio"""
+    async with GEMINI_LIMIT:
+        response = await client.aio.models.generate_content(
             model="gemini-2.5-flash-preview-tts",
             contents=text,
             config=types.GenerateContentConfig(
@@ -59,43 +67,28 @@ def generate_speech(text, output_file="speech.wav", voice="Kore"):
                 ),
             )
         )
-        
-        # Extract audio data and save to WAV file
-        audio_data = response.candidates[0].content.parts[0].inline_data.data
-        wave_file(output_file, audio_data)
-        return output_file
-        
-    except Exception as e:
-        # Final fallback to Kore if anything fails
-        if voice != DEFAULT_VOICE:
-            print(f"Voice '{voice}' failed: {e}. Trying {DEFAULT_VOICE}...")
-            try:
-                response = client.models.generate_content(
-                    model="gemini-2.5-flash-preview-tts",
-                    contents=text,
-                    config=types.GenerateContentConfig(
-                        response_modalities=["AUDIO"],
-                        speech_config=types.SpeechConfig(
-                            voice_config=types.VoiceConfig(
-                                prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                                    voice_name=DEFAULT_VOICE,
-                                )
-                            )
-                        ),
-                    )
-                )
-                
-                audio_data = response.candidates[0].content.parts[0].inline_data.data
-                wave_file(output_file, audio_data)
-                return output_file
-            except Exception as fallback_error:
-                raise fallback_error
-        else:
-            raise e
+    return response.candidates[0].content.parts[0].inline_data.data
+
+async def generate_speech(text, output_file="speech.wav", voice="Kore"):
+    """Generate speech from text using Gemini API"""
+    client = genai.Client(api_key=GEMINI_KEY)
+    
+    # Use Kore as fallback if voice not in available list
+    if voice not in AVAILABLE_VOICES:
+        print(f"Voice '{voice}' not available. Using {DEFAULT_VOICE} as fallback.")
+        voice = DEFAULT_VOICE
+    
+    # Transient failures are retried inside _call_tts; anything else is not a voice problem
+    # (the name was validated above), so retrying with another voice would only repeat it
+    audio_data = await _call_tts(client, text, voice)
+    
+    # Save audio data to WAV file
+    wave_file(output_file, audio_data)
+    return output_file
 
 async def generate_speech_async(text: str, voice_id: str = DEFAULT_VOICE, user_id: str = None):
     """
-    Generate speech from text using Gemini API (async wrapper)
+    Generate speech from text using Gemini API
     Uploads to Cloudinary and returns media info
     
     Args:
@@ -107,17 +100,11 @@ async def generate_speech_async(text: str, voice_id: str = DEFAULT_VOICE, user_i
         Dictionary with audio info
     """
     try:
-        # Create unique output file path
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_file = os.path.join(TEMP_DIR, f"speech_{timestamp}.wav")
-        
-        # Run the synchronous function in a thread
-        def sync_generate():
-            return generate_speech(text, output_file, voice_id)
+        # Create unique output file path (second-resolution timestamps collide under concurrency)
+        text_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()[:8]
+        output_file = os.path.join(TEMP_DIR, f"speech_{time.monotonic_ns():x}_{os.getpid():x}_{text_hash}.wav")
         
-        # Execute in thread pool to avoid blocking
-        loop = asyncio.get_event_loop()
-        audio_path = await loop.run_in_executor(None, sync_generate)
+        audio_path = await generate_speech(text, output_file, voice_id)
         
         # Get actual duration from the generated WAV file
         try:
@@ -135,8 +122,8 @@ async def generate_speech_async(text: str, voice_id: str = DEFAULT_VOICE, user_i
         
         # Upload to Cloudinary if user_id provided
         if user_id:
-            from services.Media.media_utils import upload_media
-            upload_result = await upload_media(
+            from services.Media.media_utils import upload_media, cleanup_temp_file
+            upload_task = asyncio.create_task(upload_media(
                 audio_path,
                 user_id,
                 folder="audio",
@@ -148,11 +135,11 @@ async def generate_speech_async(text: str, voice_id: str = DEFAULT_VOICE, user_i
                     "word_count": word_count,
                     "type": "generated_speech"
                 }
-            )
+            ))
             
-            # Clean up local file after upload
-            if os.path.exists(audio_path):
-                os.remove(audio_path)
+            # Clean up local file as soon as the upload settles, even on failure
+            upload_task.add_done_callback(lambda _: cleanup_temp_file(audio_path))
+            upload_result = await upload_task
             
             return {
                 "audio_path": audio_path,  # Keep for backward compatibility
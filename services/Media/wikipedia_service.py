@@ -1,8 +1,147 @@
-import requests
+import asyncio
+import heapq
+import httpx
 import re
-from typing import List, Dict, Optional
+import time
+from functools import lru_cache
+from typing import Any, Callable, List, Dict, Optional, Tuple
 from urllib.parse import quote, unquote
-import json
+import logging
+import orjson
+from openai import AsyncOpenAI
+from google import genai
+from config.app_config import GEMINI_KEY, OPENROUTER_KEY
+from .provider_limits import GEMINI_LIMIT, OPENROUTER_LIMIT
+
+logger = logging.getLogger(__name__)
+
+_USER_AGENT = 'AI-Video-Creator/1.0 (https://example.com/contact)'
+
+# Shared across requests so connections to Wikipedia stay alive between searches
+_http_client: Optional[httpx.AsyncClient] = None
+
+def _get_http_client() -> httpx.AsyncClient:
+    """Lazily create the shared Wikipedia HTTP client"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            # httpx already sends Accept-Encoding: gzip, deflate
+            headers={'User-Agent': _USER_AGENT, 'Accept': 'application/json'},
+            # Retry failed connection attempts (DNS/TLS/connect) before surfacing an error. The pool limits
+            # live on the transport because httpx ignores client-level limits once a transport is given:
+            # keep fan-out polite towards Wikimedia, but keep idle connections warm between searches
+            transport=httpx.AsyncHTTPTransport(
+                retries=3,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=10, keepalive_expiry=30.0),
+            ),
+            timeout=10.0,
+        )
+    return _http_client
+
+# Search results scoring below this are dropped as irrelevant
+_MIN_RELEVANCE_SCORE = 0.3
+
+# Recent API responses keyed by (url, params); fallback searches often repeat the same queries
+_RESPONSE_CACHE_SIZE = 256
+_RESPONSE_CACHE_TTL_SECONDS = 600
+_response_cache: Dict[tuple, Tuple[float, Any]] = {}
+
+async def _cached_get(url: str, params: Dict) -> Any:
+    """GET a Wikipedia API URL and return the decoded JSON, reusing fresh cached responses"""
+    key = (url, tuple(sorted(params.items())))
+    cached = _response_cache.get(key)
+    if cached is not None and time.monotonic() - cached[0] < _RESPONSE_CACHE_TTL_SECONDS:
+        return cached[1]
+    
+    response = await _get_http_client().get(url, params=params)
+    response.raise_for_status()
+    data = orjson.loads(response.content)
+    
+    _response_cache.pop(key, None)
+    if len(_response_cache) >= _RESPONSE_CACHE_SIZE:
+        _response_cache.pop(next(iter(_response_cache)))
+    _response_cache[key] = (time.monotonic(), data)
+    return data
+
+async def close_http_client():
+    """Close the shared Wikipedia HTTP client (called on application shutdown)"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+# Vietnamese specific characters
+_VIETNAMESE_CHARS_RE = re.compile('[àáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ]')
+
+@lru_cache(maxsize=512)
+def _detect_language(text: str) -> str:
+    """Detect if text is Vietnamese or English (cached, queries are scored repeatedly)"""
+    # Pure ASCII text cannot contain Vietnamese characters
+    if text.isascii():
+        return "en"
+    
+    # If more than 2 Vietnamese characters, consider it Vietnamese (stop scanning at the third)
+    text_lower = text.lower()
+    for count, _ in enumerate(_VIETNAMESE_CHARS_RE.finditer(text_lower), 1):
+        if count > 2:
+            return "vi"
+    return "en"
+
+# Precompiled patterns for query analysis
+_PERSON_NAME_RE = re.compile(r'\b[A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ][a-zàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ]*\s+[A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ][a-zàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ]*', re.IGNORECASE)
+_TITLE_INDICATOR_RE = re.compile(r'\b(?:professor|dr|mr|mrs|ms|teacher|student)\b', re.IGNORECASE)
+_CAPITALIZED_WORD_RE = re.compile(r'\b[A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ][a-zàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ]*')
+_VIET_NAME_RE = re.compile(r'\b[A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ][a-zàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ]*(?:\s+[A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỬÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ][a-zàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ]*){1,3}\b')
+_VIET_WORD_RE = re.compile(r'[a-zA-ZàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđĐ]+')
+_WORD_RE = re.compile(r'\b\w+\b')
+_WHITESPACE_RE = re.compile(r'\s+')
+_FIRST_200_WORDS_RE = re.compile(r'\S+(?: \S+){0,199}')  # Applied after whitespace is collapsed
+_SIMPLE_NAME_PATTERNS = (
+    re.compile(r'\b([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỬÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ][a-zàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ]*(?:\s+[A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỬÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ][a-zàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ]*){1,3})\b'),
+    re.compile(r'\b([A-Z]{2,})\b'),  # Acronyms
+)
+_KEYWORD_LABEL_RE = re.compile(r'^(Output:|Keywords?:|Response:)', re.IGNORECASE)
+_ANY_LABEL_RE = re.compile(r'^[^:]*:')
+
+# Common Vietnamese surnames
+_VIETNAMESE_SURNAMES = frozenset({'nguyễn', 'trần', 'lê', 'phạm', 'hoàng', 'huỳnh', 'phan', 'vũ', 'võ', 'đặng', 'bùi', 'đỗ', 'hồ', 'ngô', 'dương', 'lý'})
+_SURNAME_NAME_RE = re.compile(
+    r'\b(?:' + '|'.join(sorted(_VIETNAMESE_SURNAMES)) + r')\s+[a-zàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ\s]+\b',
+    re.IGNORECASE
+)
+_COMMON_GIVEN_NAMES = ('hoài', 'minh', 'thành', 'văn', 'thị', 'đức', 'quang', 'anh')
+_INSTITUTION_KEYWORDS = ('university', 'college', 'school', 'institute', 'trường', 'đại học', 'học viện')
+
+_VARIANT_STOP_WORDS = frozenset({'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 
+                                 'về', 'của', 'và', 'hoặc', 'nhưng', 'trong', 'trên', 'tại', 'để', 'cho', 'với', 'bởi',
+                                 'create', 'make', 'video', 'tell', 'about', 'explain'})
+_STOP_WORDS_VI = frozenset({'và', 'của', 'trong', 'với', 'từ', 'cho', 'về', 'tại', 'này', 'đó', 'một', 'các', 'những', 
+                            'được', 'có', 'là', 'không', 'thì', 'sẽ', 'đã', 'khi', 'nếu', 'mà', 'để', 'như', 'theo',
+                            'tạo', 'video', 'nội dung', 'viết', 'kịch bản', 'ngắn', 'câu chuyện', 'giải thích', 'mô tả'})
+_STOP_WORDS_EN = frozenset({'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
+                            'create', 'make', 'video', 'content', 'generate', 'write', 'script', 'short', 'story', 
+                            'tell', 'me', 'about', 'explain', 'describe'})
+_KEYWORD_FILTER_WORDS = frozenset({'input', 'output', 'example', 'examples', 'your', 'response', 'for', 'keywords'})
+
+@lru_cache(maxsize=256)
+def _query_words(search_lower: str) -> frozenset:
+    """Distinct words of a lowercased search query (shared by every result scored for it)"""
+    return frozenset(_WORD_RE.findall(search_lower))
+
+# AI keyword extractions keyed by (prompt, model); identical prompts are common while iterating on a script
+_AI_KEYWORD_CACHE_SIZE = 256
+_ai_keyword_cache: Dict[tuple, List[str]] = {}
+
+def _cache_ai_keywords(key: tuple, keywords: List[str]):
+    """Remember AI-extracted keywords, evicting the oldest entry when the cache is full"""
+    if len(_ai_keyword_cache) >= _AI_KEYWORD_CACHE_SIZE:
+        _ai_keyword_cache.pop(next(iter(_ai_keyword_cache)))
+    _ai_keyword_cache[key] = keywords
+
+@lru_cache(maxsize=256)
+def _query_names(query: str) -> tuple:
+    """Lowercased capitalized words of a query, matched against the words of each result title"""
+    return tuple(name.lower() for name in _CAPITALIZED_WORD_RE.findall(query))
 
 class WikipediaService:
     """Service for fetching and processing Wikipedia content"""
@@ -10,12 +149,8 @@ class WikipediaService:
     def __init__(self):
         self.en_search_url = "https://en.wikipedia.org/w/api.php"
         self.vi_search_url = "https://vi.wikipedia.org/w/api.php"
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'AI-Video-Creator/1.0 (https://example.com/contact)'
-        })
 
-    def search_articles(self, query: str, limit: int = 5, language: str = "auto") -> List[Dict]:
+    async def search_articles(self, query: str, limit: int = 5, language: str = "auto") -> List[Dict]:
         """
         Search for Wikipedia articles related to the query with improved accuracy
         
@@ -32,141 +167,188 @@ class WikipediaService:
             if language == "auto":
                 language = self._detect_language(query)
             
-            # Choose appropriate Wikipedia API
-            search_url = self.vi_search_url if language == "vi" else self.en_search_url
-            
-            # Try multiple search strategies for better accuracy
-            search_queries = self._generate_search_variants(query, language)
+            # Facts about the original query are the same for every scored result, in either language
+            is_person_query = self._is_person_name_query(query)
+            vietnamese_names = self._extract_vietnamese_names(query) if self._detect_language(query) == "vi" else []
             
-            all_articles = []
-            found_exact_match = False
+            if language != "vi":
+                return await self._search_language(query, limit, language, is_person_query, vietnamese_names)
             
-            for search_query in search_queries:
-                print(f"Trying search query: '{search_query}'")
-                
-                # Search for articles using Wikipedia API
-                search_params = {
-                    'action': 'query',
-                    'format': 'json',
-                    'list': 'search',
-                    'srsearch': search_query,
-                    'srlimit': limit * 2,  # Get more results to filter
-                    'srprop': 'snippet'
-                }
-                
-                search_response = self.session.get(search_url, params=search_params)
-                search_response.raise_for_status()
-                search_data = search_response.json()
-                
-                if 'query' in search_data and 'search' in search_data['query']:
-                    print(f"Found {len(search_data['query']['search'])} raw results for '{search_query}'")
-                    
-                    # Score and filter results for relevance
-                    scored_results = []
-                    for result in search_data['query']['search']:
-                        relevance_score = self._calculate_relevance_score(
-                            result['title'], 
-                            result.get('snippet', ''), 
-                            query, 
-                            search_query
-                        )
-                        scored_results.append((result, relevance_score))
-                    
-                    # Sort by relevance score (highest first)
-                    scored_results.sort(key=lambda x: x[1], reverse=True)
-                    
-                    # Filter only highly relevant results
-                    for result, score in scored_results:
-                        if score >= 0.3:  # Only include results with decent relevance
-                            article_info = self._get_article_info(result['title'], search_url)
-                            if article_info:
-                                article_info['relevance_score'] = score
-                                all_articles.append(article_info)
-                                print(f"Added article '{result['title']}' with score {score:.2f}")
-                                
-                                # Check if this is an exact match
-                                if score >= 0.8:
-                                    found_exact_match = True
-                
-                # If we found a high-quality exact match, stop searching
-                if found_exact_match and all_articles:
-                    break
-                
-                # If we have enough good results, we can stop
-                if len(all_articles) >= limit:
-                    break
+            # English Wikipedia is the fallback for Vietnamese queries; search it at the same time so a
+            # miss costs the slower of the two searches instead of both in turn
+            en_task = asyncio.create_task(
+                self._search_language(query, limit, "en", is_person_query, vietnamese_names)
+            )
+            try:
+                articles = await self._search_language(query, limit, "vi", is_person_query, vietnamese_names)
+                return articles if articles else await en_task
+            finally:
+                en_task.cancel()
             
-            # Remove duplicates and sort by relevance
-            unique_articles = []
-            seen_titles = set()
+        except Exception as e:
+            logger.error(f"Error searching Wikipedia articles: {e}")
+            return []
+
+    async def _search_language(self, query: str, limit: int, language: str,
+                               is_person_query: bool, vietnamese_names: List[str]) -> List[Dict]:
+        """
+        Search one language edition of Wikipedia with every query variant and rank the results
+        
+        Args:
+            query: Search query
+            limit: Maximum number of results to return
+            language: Wikipedia edition to search ("en" or "vi")
+            is_person_query: Whether the query looks like a person name
+            vietnamese_names: Vietnamese names in the query (empty unless it is Vietnamese)
             
-            for article in all_articles:
-                title = article.get('title', '').lower()
-                if title not in seen_titles:
-                    seen_titles.add(title)
-                    unique_articles.append(article)
+        Returns:
+            List of article information sorted by relevance
+        """
+        # Choose appropriate Wikipedia API
+        search_url = self.vi_search_url if language == "vi" else self.en_search_url
+        
+        # Try multiple search strategies for better accuracy
+        search_queries = self._generate_search_variants(query, language)
+        
+        def score(result: Dict, search_query: str) -> float:
+            return self._calculate_relevance_score(
+                result['title'],
+                result['extract'],
+                query,
+                search_query,
+                is_person_query,
+                vietnamese_names
+            )
+        
+        # Search the primary variant on its own first; the others only run (concurrently)
+        # when it did not produce a strong match
+        search_responses = await asyncio.gather(
+            *(self._search(search_query, limit, search_url, score) for search_query in search_queries[:1]),
+            return_exceptions=True
+        )
+        
+        all_articles = []
+        best_score = 0.0
+        
+        for index, search_query in enumerate(search_queries):
+            if index == len(search_responses):
+                search_responses += await asyncio.gather(
+                    *(self._search(variant, limit, search_url, score) for variant in search_queries[index:]),
+                    return_exceptions=True
+                )
+            search_data = search_responses[index]
+            logger.debug("Trying search query: '%s'", search_query)
             
-            # Sort by relevance score
-            unique_articles.sort(key=lambda x: x.get('relevance_score', 0), reverse=True)
+            if isinstance(search_data, Exception):
+                logger.warning(f"Search query '{search_query}' failed: {search_data}")
+                continue
             
-            # If no results in detected language and it's Vietnamese, try English
-            if not unique_articles and language == "vi":
-                return self.search_articles(query, limit, "en")
+            if search_data:
+                logger.debug("Found %d raw results for '%s'", len(search_data), search_query)
+                
+                # Score and filter results for relevance
+                scored_results = []
+                for result in search_data:
+                    scored_results.append((result, score(result, search_query)))
+                
+                # Keep the top relevant results (highest first)
+                relevant_results = heapq.nlargest(
+                    limit,
+                    ((result, result_score) for result, result_score in scored_results if result_score >= _MIN_RELEVANCE_SCORE),
+                    key=lambda x: x[1]
+                )
+                
+                for result, result_score in relevant_results:
+                    all_articles.append({**result, 'relevance_score': result_score})
+                    logger.debug("Added article '%s' with score %.2f", result['title'], result_score)
+                    best_score = max(best_score, result_score)
             
-            return unique_articles[:limit]
+            # If we found a strong match, stop searching
+            if best_score >= 0.6:
+                break
             
-        except Exception as e:
-            print(f"Error searching Wikipedia articles: {e}")
-            return []
+            # If we have enough good results, we can stop
+            if len(all_articles) >= limit:
+                break
+        
+        # Remove duplicates and sort by relevance
+        unique_articles = []
+        seen_titles = set()
+        
+        for article in all_articles:
+            title = article.get('title', '').lower()
+            if title not in seen_titles:
+                seen_titles.add(title)
+                unique_articles.append(article)
+        
+        # Sort by relevance score
+        unique_articles.sort(key=lambda x: x.get('relevance_score', 0), reverse=True)
+        
+        return unique_articles[:limit]
+
+    async def _search(self, search_query: str, limit: int, search_url: str,
+                      score: Callable[[Dict, str], float]) -> List[Dict]:
+        """
+        Find candidate articles for a search query, extracts included
+        
+        Tries the lightweight title prefix lookup first and falls back to a full-text search
+        when none of the title matches would pass the relevance cutoff.
+        
+        Returns:
+            List of article information with title, url, extract, in search rank order
+        """
+        results = await self._generator_search('prefixsearch', 'gps', search_query, limit * 2, search_url)
+        if any(score(result, search_query) >= _MIN_RELEVANCE_SCORE for result in results):
+            return results
+        return await self._generator_search('search', 'gsr', search_query, limit * 2, search_url)
 
-    def _get_article_info(self, title: str, search_url: str) -> Optional[Dict]:
+    async def _generator_search(self, generator: str, prefix: str, search_query: str,
+                                limit: int, search_url: str) -> List[Dict]:
         """
-        Get detailed information about a specific Wikipedia article
+        Run a search generator and fetch the intro extract of every hit in the same request
         
         Args:
-            title: Article title
+            generator: MediaWiki search generator ("prefixsearch" or "search")
+            prefix: Parameter prefix of that generator ("gps" or "gsr")
+            search_query: Query to search for
+            limit: Maximum number of hits (MediaWiki returns at most 20 intro extracts per request)
             search_url: The Wikipedia API URL to use
             
         Returns:
-            Dictionary with article information
+            List of article information with title, url, extract, in search rank order
         """
-        try:
-            # Get article extract
-            extract_params = {
-                'action': 'query',
-                'format': 'json',
-                'prop': 'extracts|info',
-                'exintro': True,
-                'explaintext': True,
-                'exsectionformat': 'plain',
-                'titles': title,
-                'inprop': 'url'
+        search_params = {
+            'action': 'query',
+            'format': 'json',
+            'generator': generator,
+            f'{prefix}search': search_query,
+            f'{prefix}limit': limit,
+            'prop': 'extracts|info',
+            'exintro': True,
+            'explaintext': True,
+            'exsectionformat': 'plain',
+            'exlimit': 'max',
+            'inprop': 'url'
+        }
+        
+        search_data = await _cached_get(search_url, search_params)
+        language = 'vi' if 'vi.wikipedia' in search_url else 'en'
+        
+        pages = sorted(
+            search_data.get('query', {}).get('pages', {}).items(),
+            key=lambda item: item[1].get('index', 0)
+        )
+        return [
+            {
+                'title': page.get('title', ''),
+                'url': page.get('fullurl', ''),
+                'extract': self._clean_extract(page.get('extract', '')),
+                'page_id': page_id,
+                'language': language
             }
-            
-            extract_response = self.session.get(search_url, params=extract_params)
-            extract_response.raise_for_status()
-            extract_data = extract_response.json()
-            
-            if 'query' in extract_data and 'pages' in extract_data['query']:
-                pages = extract_data['query']['pages']
-                page_id = list(pages.keys())[0]
-                
-                if page_id != '-1':  # Article exists
-                    page = pages[page_id]
-                    
-                    return {
-                        'title': page.get('title', ''),
-                        'url': page.get('fullurl', ''),
-                        'extract': self._clean_extract(page.get('extract', '')),
-                        'page_id': page_id,
-                        'language': 'vi' if 'vi.wikipedia' in search_url else 'en'
-                    }
-            
-            return None
-            
-        except Exception as e:
-            print(f"Error getting article info for '{title}': {e}")
-            return None
+            for page_id, page in pages
+            if not page_id.startswith('-')  # Article does not exist
+        ]
 
     def _detect_language(self, text: str) -> str:
         """
@@ -178,25 +360,20 @@ class WikipediaService:
         Returns:
             "vi" for Vietnamese, "en" for English
         """
-        # Vietnamese specific characters
-        vietnamese_chars = set('àáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ')
-        
-        # Count Vietnamese characters
-        text_lower = text.lower()
-        vietnamese_count = sum(1 for char in text_lower if char in vietnamese_chars)
-        
-        # If more than 2 Vietnamese characters, consider it Vietnamese
-        return "vi" if vietnamese_count > 2 else "en"
+        return _detect_language(text)
 
-    def _calculate_relevance_score(self, title: str, snippet: str, original_query: str, search_query: str) -> float:
+    def _calculate_relevance_score(self, title: str, snippet: str, original_query: str, search_query: str,
+                                   is_person_query: bool, vietnamese_names: List[str]) -> float:
         """
         Calculate relevance score for a Wikipedia article based on multiple factors
         
         Args:
             title: Article title
-            snippet: Article snippet/description
+            snippet: Article description (the intro extract)
             original_query: Original user query
             search_query: The specific search query variant used
+            is_person_query: Whether the original query looks like a person name
+            vietnamese_names: Vietnamese names in the original query (empty unless it is Vietnamese)
             
         Returns:
             Float score between 0 and 1, where 1 is most relevant
@@ -205,6 +382,7 @@ class WikipediaService:
         
         # Normalize text for comparison
         title_lower = title.lower()
+        title_words = frozenset(_WORD_RE.findall(title_lower))
         snippet_lower = snippet.lower()
         original_lower = original_query.lower()
         search_lower = search_query.lower()
@@ -222,92 +400,68 @@ class WikipediaService:
             score += 0.5
         
         # 4. Search query words appear in title
-        search_words = search_lower.split()
-        title_words = title_lower.split()
+        search_words = _query_words(search_lower)
         
         # Calculate word overlap ratio in title
-        matching_words = sum(1 for word in search_words if word in title_lower)
         if search_words:
-            word_match_ratio = matching_words / len(search_words)
-            score += word_match_ratio * 0.4
+            matching_words = len(search_words & title_words)
+            score += matching_words / len(search_words) * 0.4
+        
+        # 7. Penalize disambiguation pages unless specifically looking for them
+        # (checked up front so the remaining boosts can stop once the score is capped)
+        is_disambiguation = '(disambiguation)' in title_lower and '(disambiguation)' not in original_lower
+        if score >= 1.0 and not is_disambiguation:
+            return 1.0
         
         # 5. Check for name patterns (important for Vietnamese names)
-        if self._is_person_name_query(original_query):
-            if self._matches_person_name_pattern(title, original_query):
+        if is_person_query:
+            if self._matches_person_name_pattern(title_words, original_query):
                 score += 0.3
+                if score >= 1.0 and not is_disambiguation:
+                    return 1.0
         
         # 6. Snippet relevance
-        if snippet_lower:
-            snippet_words = snippet_lower.split()
-            snippet_matches = sum(1 for word in search_words if word in snippet_lower)
-            if search_words:
-                snippet_ratio = snippet_matches / len(search_words)
-                score += snippet_ratio * 0.2
+        if snippet_lower and search_words:
+            snippet_matches = len(search_words.intersection(_WORD_RE.findall(snippet_lower)))
+            score += snippet_matches / len(search_words) * 0.2
         
-        # 7. Penalize disambiguation pages unless specifically looking for them
-        if '(disambiguation)' in title_lower and '(disambiguation)' not in original_lower:
+        if is_disambiguation:
             score *= 0.3
         
         # 8. Boost score for exact name matches in Vietnamese
-        if self._detect_language(original_query) == "vi":
-            # Look for exact Vietnamese name matches
-            vietnamese_names = self._extract_vietnamese_names(original_query)
-            for name in vietnamese_names:
-                if name.lower() in title_lower:
-                    score += 0.4
-                    break
+        for name in vietnamese_names:
+            if name.lower() in title_lower:
+                score += 0.4
+                break
         
         return min(score, 1.0)  # Cap at 1.0
 
     def _is_person_name_query(self, query: str) -> bool:
         """Check if the query appears to be asking about a person"""
         # Look for patterns that suggest a person name query
-        name_indicators = [
-            r'\b[A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ][a-zàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ]*\s+[A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ][a-zàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ]*',  # First Last name pattern
-            r'\b(?:professor|dr|mr|mrs|ms|teacher|student)\b'  # Title indicators
-        ]
-        
-        for pattern in name_indicators:
-            if re.search(pattern, query, re.IGNORECASE):
-                return True
-        
-        return False
+        return bool(_PERSON_NAME_RE.search(query) or _TITLE_INDICATOR_RE.search(query))
     
-    def _matches_person_name_pattern(self, title: str, query: str) -> bool:
-        """Check if the title matches a person name pattern from the query"""
+    def _matches_person_name_pattern(self, title_words: frozenset, query: str) -> bool:
+        """Check if the title (given as its lowercased words) matches a person name pattern from the query"""
         # Extract potential names from query
-        query_names = re.findall(r'\b[A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ][a-zàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ]*', query)
+        query_names = _query_names(query)
         
         if not query_names:
             return False
         
-        title_lower = title.lower()
-        
         # Check if names appear in the title in any order
-        name_matches = 0
-        for name in query_names:
-            if name.lower() in title_lower:
-                name_matches += 1
+        name_matches = sum(1 for name in query_names if name in title_words)
         
         # Consider it a name match if most names are found
         return name_matches >= len(query_names) * 0.6
     
     def _extract_vietnamese_names(self, text: str) -> List[str]:
         """Extract Vietnamese names from text"""
-        # Common Vietnamese surname patterns
-        vietnamese_surnames = ['nguyễn', 'trần', 'lê', 'phạm', 'hoàng', 'huỳnh', 'phan', 'vũ', 'võ', 'đặng', 'bùi', 'đỗ', 'hồ', 'ngô', 'dương', 'lý']
-        
-        names = []
-        
         # Look for patterns: Surname + Given names
-        for surname in vietnamese_surnames:
-            pattern = rf'\b{surname}\s+[a-zàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ\s]+\b'
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            names.extend(matches)
+        names = _SURNAME_NAME_RE.findall(text)
         
         # Also look for capitalized word sequences (potential names)
-        name_pattern = r'\b[A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ][a-zàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ]*(?:\s+[A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỬÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ][a-zàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ]*){1,3}\b'
-        potential_names = re.findall(name_pattern, text)
+        potential_names = [] if text.islower() else _VIET_NAME_RE.findall(text)
         names.extend(potential_names)
         
         return list(set(names))  # Remove duplicates
@@ -324,26 +478,32 @@ class WikipediaService:
             List of search query variants, ordered by priority
         """
         variants = []
+        covered_words = set()
+        
+        def add(variant: str):
+            # Keep variants in priority order, dropping any whose words are all covered by earlier ones
+            variant_words = frozenset(_WORD_RE.findall(variant.lower()))
+            if variant_words and not variant_words <= covered_words:
+                covered_words.update(variant_words)
+                variants.append(variant.strip())
+        
+        query_lower = query.lower()
         
         # 1. Original query (cleaned)
         clean_query = self._clean_query(query, language)
         if clean_query:
-            variants.append(clean_query)
+            add(clean_query)
         
         # 2. Try exact phrase search (in quotes)
         if len(clean_query.split()) > 1:
-            variants.append(f'"{clean_query}"')
+            add(f'"{clean_query}"')
         
         # 3. Try individual meaningful words for fallback
         words = clean_query.split()
         meaningful_words = []
         
-        stop_words = {'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 
-                     'về', 'của', 'và', 'hoặc', 'nhưng', 'trong', 'trên', 'tại', 'để', 'cho', 'với', 'bởi',
-                     'create', 'make', 'video', 'tell', 'about', 'explain'}
-        
         for word in words:
-            if len(word) > 2 and word.lower() not in stop_words:
+            if len(word) > 2 and word.lower() not in _VARIANT_STOP_WORDS:
                 meaningful_words.append(word)
         
         # 4. For person names, try different arrangements
@@ -351,69 +511,47 @@ class WikipediaService:
             # Try full names
             potential_names = self._extract_vietnamese_names(query) if language == "vi" else []
             for name in potential_names:
-                if name not in variants:
-                    variants.append(name)
+                add(name)
             
             # Try surname only (for Vietnamese names)
             if language == "vi":
                 for word in meaningful_words:
-                    vietnamese_surnames = ['nguyễn', 'trần', 'lê', 'phạm', 'hoàng', 'huỳnh', 'phan', 'vũ', 'võ', 'đặng', 'bùi', 'đỗ', 'hồ', 'ngô', 'dương', 'lý']
-                    if word.lower() in vietnamese_surnames:
+                    if word.lower() in _VIETNAMESE_SURNAMES:
                         # Try surname + common given names
-                        common_givens = ['hoài', 'minh', 'thành', 'văn', 'thị', 'đức', 'quang', 'anh']
-                        for given in common_givens:
-                            if given in query.lower():
-                                variants.append(f"{word} {given}")
+                        for given in _COMMON_GIVEN_NAMES:
+                            if given in query_lower:
+                                add(f"{word} {given}")
         
         # 5. Try institution/organization names
-        institution_keywords = ['university', 'college', 'school', 'institute', 'trường', 'đại học', 'học viện']
-        for keyword in institution_keywords:
-            if keyword.lower() in query.lower():
+        query_words = query.split()
+        for keyword in _INSTITUTION_KEYWORDS:
+            if keyword in query_lower:
                 # Extract the full institution name
-                words_around = []
-                query_words = query.split()
                 for i, word in enumerate(query_words):
-                    if word.lower() == keyword.lower():
+                    if word.lower() == keyword:
                         # Get surrounding words
                         start = max(0, i-2)
                         end = min(len(query_words), i+3)
-                        institution_name = ' '.join(query_words[start:end])
-                        if institution_name not in variants:
-                            variants.append(institution_name)
+                        add(' '.join(query_words[start:end]))
         
         # 6. Add individual meaningful words as fallback
         for word in meaningful_words:
-            if len(word) > 3 and word not in variants:
-                variants.append(word)
+            if len(word) > 3:
+                add(word)
         
-        # Remove duplicates while preserving order
-        seen = set()
-        unique_variants = []
-        for variant in variants:
-            if variant.lower() not in seen and variant.strip():
-                seen.add(variant.lower())
-                unique_variants.append(variant.strip())
-        
-        return unique_variants[:8]  # Limit to top 8 variants
+        return variants[:8]  # Limit to top 8 variants
 
     def _clean_query(self, query: str, language: str) -> str:
         """Clean and optimize query for Wikipedia search"""
         # Language-specific stop words
-        if language == "vi":
-            stop_words = {'và', 'của', 'trong', 'với', 'từ', 'cho', 'về', 'tại', 'này', 'đó', 'một', 'các', 'những', 
-                         'được', 'có', 'là', 'không', 'thì', 'sẽ', 'đã', 'khi', 'nếu', 'mà', 'để', 'như', 'theo',
-                         'tạo', 'video', 'nội dung', 'viết', 'kịch bản', 'ngắn', 'câu chuyện', 'giải thích', 'mô tả'}
-        else:
-            stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
-                         'create', 'make', 'video', 'content', 'generate', 'write', 'script', 'short', 'story', 
-                         'tell', 'me', 'about', 'explain', 'describe'}
+        stop_words = _STOP_WORDS_VI if language == "vi" else _STOP_WORDS_EN
         
         # Extract meaningful keywords
         if language == "vi":
             # For Vietnamese, keep whole words including names
-            words = re.findall(r'[a-zA-ZàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđĐ]+', query)
+            words = _VIET_WORD_RE.findall(query)
         else:
-            words = re.findall(r'\b\w+\b', query.lower())
+            words = _WORD_RE.findall(query.lower())
         
         meaningful_words = []
         for word in words:
@@ -431,16 +569,16 @@ class WikipediaService:
             return ""
         
         # Remove excessive whitespace and newlines
-        cleaned = re.sub(r'\s+', ' ', extract.strip())
+        cleaned = _WHITESPACE_RE.sub(' ', extract.strip())
         
         # Truncate to reasonable length (around 200 words)
-        words = cleaned.split()
-        if len(words) > 200:
-            cleaned = ' '.join(words[:200]) + '...'
+        first_words = _FIRST_200_WORDS_RE.match(cleaned)
+        if first_words and first_words.end() < len(cleaned):
+            return first_words.group() + '...'
         
         return cleaned
 
-    def get_relevant_content(self, topic: str, max_articles: int = 3, model: str = "deepseek") -> Dict:
+    async def get_relevant_content(self, topic: str, max_articles: int = 3, model: str = "deepseek") -> Dict:
         """
         Get relevant Wikipedia content for a topic
         
@@ -453,32 +591,42 @@ class WikipediaService:
             Dictionary containing articles and summary content
         """
         try:
-            # First try with the full topic
-            articles = self.search_articles(topic, limit=max_articles, language="auto")
-            
-            # If no results, try alternative search strategies
-            if not articles:
-                # Strategy 1: Use AI to extract better keywords
-                keywords = self.extract_keywords_with_ai(topic, model)
-                print(f"AI extracted keywords for search using {model}: {keywords}")
+            # Start the AI keyword extraction alongside the first search so the fallback
+            # doesn't add a full LLM round trip when the topic finds nothing
+            keywords_task = asyncio.create_task(self.extract_keywords_with_ai(topic, model))
+            
+            try:
+                # First try with the full topic
+                articles = await self.search_articles(topic, limit=max_articles, language="auto")
+            
+                # If no results, try alternative search strategies
+                if not articles:
+                    # Strategy 1: Use AI to extract better keywords
+                    keywords = await keywords_task
+                    logger.debug("AI extracted keywords for search using %s: %s", model, keywords)
                 
-                for keyword in keywords:
-                    if keyword:
-                        print(f"Trying search with AI keyword: {keyword}")
-                        articles = self.search_articles(keyword, limit=max_articles, language="auto")
-                        if articles:
-                            print(f"Found {len(articles)} articles for AI keyword: {keyword}")
-                            break
+                    for keyword in keywords:
+                        if keyword:
+                            logger.debug("Trying search with AI keyword: %s", keyword)
+                            articles = await self.search_articles(keyword, limit=max_articles, language="auto")
+                            if articles:
+                                logger.debug("Found %d articles for AI keyword: %s", len(articles), keyword)
+                                break
+            finally:
+                # Don't leave the extraction running (and holding an LLM slot) when it wasn't needed,
+                # a search failed, or this call was cancelled by a caller's timeout
+                if not keywords_task.done():
+                    keywords_task.cancel()
             
             # If still no results, try searching individual words
             if not articles:
                 words = topic.split()
                 for word in words:
                     if len(word) > 3:  # Only try meaningful words
-                        print(f"Trying search with word: {word}")
-                        articles = self.search_articles(word, limit=max_articles, language="auto")
+                        logger.debug("Trying search with word: %s", word)
+                        articles = await self.search_articles(word, limit=max_articles, language="auto")
                         if articles:
-                            print(f"Found {len(articles)} articles for word: {word}")
+                            logger.debug("Found %d articles for word: %s", len(articles), word)
                             break
             
             # Create a summary of all relevant content
@@ -506,7 +654,7 @@ class WikipediaService:
             }
             
         except Exception as e:
-            print(f"Error getting relevant content for '{topic}': {e}")
+            logger.error(f"Error getting relevant content for '{topic}': {e}")
             return {
                 'sources': [],
                 'combined_content': '',
@@ -514,7 +662,7 @@ class WikipediaService:
                 'found_articles': 0
             }
 
-    def extract_keywords_with_ai(self, prompt: str, model: str = "deepseek") -> List[str]:
+    async def extract_keywords_with_ai(self, prompt: str, model: str = "deepseek") -> List[str]:
         """
         Use AI to extract the most relevant Wikipedia search keywords from a prompt
         
@@ -525,6 +673,10 @@ class WikipediaService:
         Returns:
             List of AI-suggested keywords for Wikipedia search
         """
+        cache_key = (prompt, model.lower())
+        if cache_key in _ai_keyword_cache:
+            return list(_ai_keyword_cache[cache_key])
+        
         try:
             # Create AI prompt for keyword extraction
             keyword_prompt = f"""
@@ -555,46 +707,42 @@ Your response for "{prompt}":
             # Use the specified AI model
             if model.lower() == "gemini":
                 # Use Gemini model
-                from google import genai
-                from config.app_config import GEMINI_KEY
-                
                 client = genai.Client(api_key=GEMINI_KEY)
                 
-                response = client.models.generate_content(
-                    model="gemini-2.0-flash",
-                    contents=[keyword_prompt],  
-                )
+                async with GEMINI_LIMIT:
+                    response = await client.aio.models.generate_content(
+                        model="gemini-2.0-flash",
+                        contents=[keyword_prompt],  
+                    )
                 ai_content = response.text
                 
-                print(f"Using Gemini for keyword extraction: {ai_content}")
+                logger.debug("Using Gemini for keyword extraction: %s", ai_content)
             else:
                 # Use DeepSeek model (default)
-                from openai import OpenAI
-                from config.app_config import OPENROUTER_KEY
-
-                client = OpenAI(
+                client = AsyncOpenAI(
                     base_url="https://openrouter.ai/api/v1",
                     api_key=OPENROUTER_KEY,
                 )
                 
-                completion = client.chat.completions.create(
-                    extra_body={},
-                    model="deepseek/deepseek-chat-v3-0324:free",
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": keyword_prompt,
-                                },
-                            ]    
-                        }
-                    ],
-                )
+                async with OPENROUTER_LIMIT:
+                    completion = await client.chat.completions.create(
+                        extra_body={},
+                        model="deepseek/deepseek-chat-v3-0324:free",
+                        messages=[
+                            {
+                                "role": "user",
+                                "content": [
+                                    {
+                                        "type": "text",
+                                        "text": keyword_prompt,
+                                    },
+                                ]    
+                            }
+                        ],
+                    )
                 
                 ai_content = completion.choices[0].message.content
-                print(f"Using DeepSeek for keyword extraction: {ai_content}")
+                logger.debug("Using DeepSeek for keyword extraction: %s", ai_content)
             
             # Extract keywords from AI response
             # Look for the actual keyword list (usually the last line or after specific patterns)
@@ -619,24 +767,25 @@ Your response for "{prompt}":
             # Clean and split keywords
             if keywords_line:
                 # Remove any remaining instructional text
-                keywords_line = re.sub(r'^(Output:|Keywords?:|Response:)', '', keywords_line, flags=re.IGNORECASE).strip()
-                keywords_line = re.sub(r'^[^:]*:', '', keywords_line).strip()  # Remove any "something:" prefix
+                keywords_line = _KEYWORD_LABEL_RE.sub('', keywords_line).strip()
+                keywords_line = _ANY_LABEL_RE.sub('', keywords_line).strip()  # Remove any "something:" prefix
                 
                 keywords = [kw.strip() for kw in keywords_line.split(',') if kw.strip()]
                 
                 # Filter out any remaining instructional words
-                filter_words = {'input', 'output', 'example', 'examples', 'your', 'response', 'for', 'keywords'}
-                keywords = [kw for kw in keywords if kw.lower() not in filter_words and len(kw) > 1]
+                keywords = [kw for kw in keywords if kw.lower() not in _KEYWORD_FILTER_WORDS and len(kw) > 1]
                 
-                print(f"AI extracted keywords using {model}: {keywords}")
-                return keywords[:3]  # Return top 3 keywords
+                logger.debug("AI extracted keywords using %s: %s", model, keywords)
+                keywords = keywords[:3]  # Return top 3 keywords
+                _cache_ai_keywords(cache_key, keywords)
+                return list(keywords)
             
             # If AI extraction fails, fallback to simple extraction
-            print(f"AI keyword extraction with {model} failed, falling back to simple method")
+            logger.warning(f"AI keyword extraction with {model} failed, falling back to simple method")
             return self.extract_keywords_from_prompt_simple(prompt)
             
         except Exception as e:
-            print(f"Error in AI keyword extraction with {model}: {e}")
+            logger.error(f"Error in AI keyword extraction with {model}: {e}")
             # Fallback to simple extraction
             return self.extract_keywords_from_prompt_simple(prompt)
 
@@ -649,16 +798,17 @@ Your response for "{prompt}":
         
         keywords = []
         
-        # Look for proper names (capitalized words)
-        name_patterns = [
-            r'\b([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỬÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ][a-zàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ]*(?:\s+[A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỬÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ][a-zàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ]*){1,3})\b',
-            r'\b([A-Z]{2,})\b'  # Acronyms
-        ]
+        # Names and acronyms need an uppercase letter; skip the scan for all-lowercase prompts
+        if prompt.islower():
+            return keywords
         
-        for pattern in name_patterns:
-            matches = re.findall(pattern, prompt)
-            for match in matches:
-                if match and len(match.strip()) > 1:
-                    keywords.append(match.strip())
+        # Look for proper names (capitalized words); only the first 3 are used
+        for pattern in _SIMPLE_NAME_PATTERNS:
+            for match in pattern.finditer(prompt):
+                keyword = match.group(1).strip()
+                if len(keyword) > 1:
+                    keywords.append(keyword)
+                    if len(keywords) == 3:
+                        return keywords
         
-        return keywords[:3]
+        return keywords
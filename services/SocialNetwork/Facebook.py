@@ -3,23 +3,121 @@ from models import User,SocialVideoCreate
 from services import check_facebook_credentials, get_media_by_id
 from .SocialUtils import add_social_video
 from fastapi import HTTPException, status
-from config import user_collection
+from config import user_collection, FB_GRAPH_CONCURRENCY
 from schemas import SocialPlatform
-import requests
-from typing import Any,List
+import asyncio
+import heapq
+import httpx
+import orjson
+import time
+from typing import Any,List,Optional
 from bson import ObjectId
 from datetime import datetime
-from dateutil.parser import parse
+from urllib.parse import urlencode
 collection = user_collection()
-async def upload_video_to_facebook(user: User,page_id:str, upload_request: VideoUpLoadRequest) -> str:
+
+# Uploaded videos are always public
+_PUBLIC_PRIVACY = orjson.dumps({"value": "EVERYONE"}).decode()
+
+# Shared Graph API client so connections to graph.facebook.com are reused across calls
+_graph_client: Optional[httpx.AsyncClient] = None
+
+def _get_graph_client() -> httpx.AsyncClient:
+    """Lazily create the shared Graph API HTTP client"""
+    global _graph_client
+    if _graph_client is None or _graph_client.is_closed:
+        _graph_client = httpx.AsyncClient(
+            # HTTP/2 lets concurrent Graph calls share one multiplexed connection
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=60.0),
+            timeout=30.0,
+        )
+    return _graph_client
+
+# Every Graph call goes through one semaphore: a steady queue beats bursts that come back as 429s
+_GRAPH_CONCURRENCY = asyncio.Semaphore(FB_GRAPH_CONCURRENCY)
+# Usage headers report the share of the app/page quota used so far, in percent
+_USAGE_HEADERS = ("x-app-usage", "x-page-usage")
+_USAGE_THROTTLE_PERCENT = 80
+_USAGE_BACKOFF_SECONDS = 1.0
+
+def _quota_usage(response: httpx.Response) -> float:
+    """Highest quota percentage reported in the response's usage headers"""
+    usage = 0.0
+    for header in _USAGE_HEADERS:
+        value = response.headers.get(header)
+        if not value:
+            continue
+        try:
+            usage = max(usage, *orjson.loads(value).values())
+        except (orjson.JSONDecodeError, AttributeError, TypeError):
+            continue
+    return usage
+
+async def _graph_request(method: str, url: str, **kwargs) -> httpx.Response:
+    """Send a Graph API request on the shared client, within the global concurrency limit"""
+    async with _GRAPH_CONCURRENCY:
+        response = await _get_graph_client().request(method, url, **kwargs)
+        # Close to the quota: hold the slot a little longer so the rest of the queue slows down
+        if _quota_usage(response) >= _USAGE_THROTTLE_PERCENT:
+            await asyncio.sleep(_USAGE_BACKOFF_SECONDS)
+    return response
+
+# Strong references to fire-and-forget tasks so they aren't garbage-collected mid-run
+_background_tasks: set = set()
+
+def _run_in_background(coro) -> None:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+# Page metadata only changes when Facebook is (re-)linked, which also issues a new access token,
+# so keying by (user id, token) drops stale entries without explicit invalidation
+_PAGES_CACHE_TTL_SECONDS = 300
+_PAGES_CACHE_SIZE = 1024
+_user_pages_cache: dict[tuple, tuple[float, Any]] = {}
+_pages_by_id_cache: dict[tuple, tuple[float, Any]] = {}
+
+def _facebook_credentials(user: User) -> dict:
+    return (user.social_credentials or {}).get('facebook') or {}
+
+def _facebook_pages(user: User) -> List[dict]:
+    """Pages linked to the user's Facebook account, [] if none"""
+    return _facebook_credentials(user).get('pages') or []
+
+def _pages_cache_key(user: User) -> tuple:
+    return (str(user.id), _facebook_credentials(user).get('access_token'))
+
+# Which page (token) and post a video belongs to never changes, so keep it for an hour
+_VIDEO_PAGE_CACHE_TTL_SECONDS = 3600
+_VIDEO_PAGE_CACHE_SIZE = 10_000
+_video_page_cache: dict[tuple, tuple[float, Any]] = {}
+
+def _cache_get(cache: dict, key: tuple, ttl: float = _PAGES_CACHE_TTL_SECONDS):
+    cached = cache.get(key)
+    if cached is not None and time.monotonic() - cached[0] < ttl:
+        return cached[1]
+    return None
+
+def _cache_put(cache: dict, key: tuple, value: Any, max_size: int = _PAGES_CACHE_SIZE):
+    cache.pop(key, None)
+    if len(cache) >= max_size:
+        cache.pop(next(iter(cache)))
+    cache[key] = (time.monotonic(), value)
+
+async def close_graph_client():
+    """Close the shared Graph API HTTP client (called on application shutdown)"""
+    global _graph_client
+    if _graph_client is not None:
+        await _graph_client.aclose()
+        _graph_client = None
+
+async def upload_video_to_facebook(user: User,page_id:str, upload_request: VideoUpLoadRequest, page: Optional[dict] = None) -> str:
     try:
-        access_token =await check_facebook_credentials(user)
-        if not user.social_credentials or 'facebook' not in user.social_credentials:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="User does not have Facebook credentials"
-            )
-        page = await get_page_by_pageid(user, page_id)
+        # Callers that already resolved the page (SocialCommon.upload_video) pass it in
+        if page is None:
+            await check_facebook_credentials(user)
+            page = await get_page_by_pageid(user, page_id)
         if not page:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -51,14 +149,14 @@ async def upload_video_to_facebook(user: User,page_id:str, upload_request: Video
             "description": upload_request.description,
             "file_url": media_url,
             "access_token": page_access_token,
-            "privacy": "{\"value\":\"EVERYONE\"}"  # Always public
+            "privacy": _PUBLIC_PRIVACY  # Always public
         }
         # Remove commented privacy mapping code since we always use public
         if upload_request.tags:
             upload_data["tags"] = ",".join(upload_request.tags)
         
-        response = requests.post(upload_url, data=upload_data)
-        result = response.json()
+        response = await _graph_request("POST", upload_url, data=upload_data)
+        result = orjson.loads(response.content)
         if "error" in result:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -77,7 +175,9 @@ async def upload_video_to_facebook(user: User,page_id:str, upload_request: Video
             video_url=video_id,
             page_id=page_id
         )
-        await add_social_video(social_video_data)
+        # The upload is already confirmed; record it without holding up the response
+        # (add_social_video logs its own failures)
+        _run_in_background(add_social_video(social_video_data))
         return f"https://www.facebook.com/{video_id}"
     except HTTPException as e:
         raise  HTTPException(
@@ -85,58 +185,99 @@ async def upload_video_to_facebook(user: User,page_id:str, upload_request: Video
             detail=f"Failed to upload video to Facebook: {e.detail}"
         )
 async def get_page_by_pageid(user:User,page_id:str):
-    for page in user.social_credentials.get('facebook', {}).get('pages', []):
-        if page.get('id') == page_id:
-            return page
+    key = _pages_cache_key(user)
+    pages_by_id = _cache_get(_pages_by_id_cache, key)
+    if pages_by_id is None:
+        pages_by_id = {page.get('id'): page for page in _facebook_pages(user)}
+        _cache_put(_pages_by_id_cache, key, pages_by_id)
+    return pages_by_id.get(page_id)
         
+async def _resolve_video_page(user: User, access_token: str, video_id: str, post_id_from_video_id: str):
+    """Find which of the user's pages owns a video; returns (page_access_token, post_id)"""
+    cache_key = (str(user.id), video_id)
+    resolved = _cache_get(_video_page_cache, cache_key, _VIDEO_PAGE_CACHE_TTL_SECONDS)
+    if resolved is not None:
+        return resolved
+    
+    facebook_pages = _facebook_pages(user)
+    if not facebook_pages:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No Facebook pages found for user"
+        )
+    
+    # Probe every page's token against the post in one batch call
+    candidates = [
+        (user_page.get('access_token'), f"{user_page.get('id')}_{post_id_from_video_id}")
+        for user_page in facebook_pages
+        if user_page.get('access_token')
+    ] if post_id_from_video_id else []
+    try:
+        probes = await graph_batch(access_token, [
+            # fields=id keeps each probe to a bare existence check
+            f"{test_post_id}?{urlencode({'fields': 'id', 'access_token': page_token})}"
+            for page_token, test_post_id in candidates
+        ])
+    except Exception:
+        probes = []
+    for candidate, probe in zip(candidates, probes):
+        if probe:
+            _cache_put(_video_page_cache, cache_key, candidate, _VIDEO_PAGE_CACHE_SIZE)
+            return candidate
+    
+    page = facebook_pages[0]
+    post_id = f"{page['id']}_{post_id_from_video_id}" if post_id_from_video_id else None
+    return page.get('access_token'), post_id
+
+async def _fetch_video_stats(page_access_token: str, post_id: str, video_id: str):
+    """Reactions, comments and shares of a video in a single batched Graph call
+
+    Returns None when the post can't be read, e.g. the page was re-linked or its token rotated
+    """
+    stat_urls = [f"{_reactions_url(post_id)},shares", _comments_url(video_id)]
+    try:
+        stats = await graph_batch(page_access_token, stat_urls)
+    except Exception:
+        return None
+    if not stats[0]:
+        return None
+    return _reaction_counts(stats[0]), _summary_count(stats[1]), stats[0].get("shares", {}).get("count", 0)
+
 async def get_facebook_video_stats(user: User, video_id: str,page_id:str=None) -> FacebookVideoStatsResponse:
     try:
         access_token = await check_facebook_credentials(user)
         
-        video_info = await get_video_basic_info(video_id, access_token)
-        
-        facebook_pages = user.social_credentials.get('facebook', {}).get('pages', [])
-        page = None
-        page_access_token = None
-        
-        for user_page in facebook_pages:
-            page_id = user_page.get('id')
-            post_id_from_video_id = video_info.get("post_id")
-            if post_id_from_video_id:
-                test_post_id = f"{page_id}_{post_id_from_video_id}"
-                try:
-                    temp_page_token = user_page.get('access_token')
-                    if temp_page_token:
-                        test_url = f"https://graph.facebook.com/v23.0/{test_post_id}"
-                        response = requests.get(test_url, params={'access_token': temp_page_token})
-                        if response.status_code == 200:
-                            page = user_page
-                            page_access_token = temp_page_token
-                            post_id = test_post_id
-                            break
-                except:
-                    continue
-        
-        if not page:
-            if facebook_pages:
-                page = facebook_pages[0]
-                page_access_token = page.get('access_token')
-                post_id_from_video_id = video_info.get("post_id")
-                post_id = f"{page['id']}_{post_id_from_video_id}" if post_id_from_video_id else None
-            else:
+        cache_key = (str(user.id), video_id)
+        resolved = _cache_get(_video_page_cache, cache_key, _VIDEO_PAGE_CACHE_TTL_SECONDS)
+        video_info = None
+        video_stats = None
+        if resolved is not None:
+            # Owning page already known: basic info and stats don't depend on each other
+            page_access_token, post_id = resolved
+            video_info, video_stats = await asyncio.gather(
+                get_video_basic_info(video_id, access_token),
+                _fetch_video_stats(page_access_token, post_id, video_id)
+            )
+            if video_stats is None:
+                # The cached page no longer works for this post; probe the user's pages again once
+                _video_page_cache.pop(cache_key, None)
+        if video_stats is None:
+            if video_info is None:
+                video_info = await get_video_basic_info(video_id, access_token)
+            
+            page_access_token, post_id = await _resolve_video_page(user, access_token, video_id, video_info.get("post_id"))
+            
+            if not page_access_token:
                 raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="No Facebook pages found for user"
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Page access token not found"
                 )
-        
-        if not page_access_token:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Page access token not found"
-            )
-        reactions = await get_video_creations(post_id, page_access_token)
-        comments = await get_video_comments(video_id, page_access_token)
-        shares = await get_video_shares(post_id, page_access_token)
+            video_stats = await _fetch_video_stats(page_access_token, post_id, video_id)
+            if video_stats is None:
+                _video_page_cache.pop(cache_key, None)
+                # Missing counts are reported as 0 rather than failing the whole response
+                video_stats = (_reaction_counts({}), 0, 0)
+        reactions, comments, shares = video_stats
         return FacebookVideoStatsResponse(
             platform=SocialPlatform.FACEBOOK,
             title=video_info.get("title", ""),
@@ -162,8 +303,8 @@ async def get_video_basic_info(video_id: str, access_token: str) -> dict:
             "access_token": access_token,
             "fields": "title,description,created_time,privacy,permalink_url,post_id,views"
         }
-        response = requests.get(url, params=params)
-        data = response.json()
+        response = await _graph_request("GET", url, params=params)
+        data = orjson.loads(response.content)
         if "error" in data:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -180,81 +321,92 @@ async def get_video_basic_info(video_id: str, access_token: str) -> dict:
     except Exception as e:
         return{}
 
-async def get_video_creations(post_id: str, access_token: str) -> dict:
-        reactions=["LIKE", "LOVE", "WOW", "HAHA", "SAD", "ANGRY"]
-        reactions_count ={}
-        url = f"https://graph.facebook.com/v23.0/{post_id}/reactions"
-        for reaction in reactions:
-            try:
-                params ={
-                    "access_token": access_token,
-                    "type": reaction,
-                    "summary": "total_count",
-                    "limit": 0  
-                }
-                response = requests.get(url, params=params)
-                data = response.json()
-                if "summary" in data and "error" not in data:
-                    reactions_count[reaction] = data["summary"].get("total_count", 0)
-                else:
-                    reactions_count[reaction] = 0
-            except Exception as e:
-                reactions_count[reaction] = 0
-        return reactions_count
-async def get_video_comments(video_id: str, access_token: str) -> int:
-    try:
-        comments_url = f"https://graph.facebook.com/v23.0/{video_id}/comments"
-        params = {
-            "access_token": access_token,
-            "summary": "total_count",
-            "limit": 0  
-        }
-        response = requests.get(comments_url, params=params)
-        data = response.json()
-        if "summary" in data:
-            return data["summary"].get("total_count", 0)
-        return 0
-    except Exception as e:
-        return 0
+_REACTION_TYPES = ("LIKE", "LOVE", "WOW", "HAHA", "SAD", "ANGRY")
+# One aliased field expansion per reaction type, so every total comes back from a single request
+_REACTION_FIELDS = ",".join(
+    f"reactions.type({reaction}).limit(0).summary(total_count).as({reaction.lower()})"
+    for reaction in _REACTION_TYPES
+)
+# Graph API accepts at most 50 requests per batch
+_GRAPH_BATCH_LIMIT = 50
+
+async def graph_batch(access_token: str, relative_urls: List[str]) -> List[dict]:
+    """
+    Run Graph API GET requests as batch calls (up to 50 requests per call, calls run concurrently)
     
-async def get_video_shares(post_id: str, access_token: str) -> int:
-    try:
-        shares_url = f"https://graph.facebook.com/v23.0/{post_id}"
-        params = {
+    Returns the decoded body of each request in order, {} for requests that failed
+    """
+    async def run_chunk(chunk: List[str]) -> List[dict]:
+        response = await _graph_request("POST", "https://graph.facebook.com/v23.0/", data={
             "access_token": access_token,
-            "fields": "shares"
-        }
-        response = requests.get(shares_url, params=params)
-        data = response.json()
-        if "shares" in data:
-            return data["shares"].get("count", 0)
-        return 0
-    except Exception as e:
-        return 0
+            "include_headers": "false",
+            "batch": orjson.dumps([{"method": "GET", "relative_url": url} for url in chunk]).decode()
+        })
+        data = orjson.loads(response.content)
+        if isinstance(data, dict) and "error" in data:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Error: {data['error']['message']}"
+            )
+        return [
+            orjson.loads(item["body"]) if item and item.get("code") == 200 else {}
+            for item in data
+        ]
     
+    chunks = await asyncio.gather(*(
+        run_chunk(relative_urls[start:start + _GRAPH_BATCH_LIMIT])
+        for start in range(0, len(relative_urls), _GRAPH_BATCH_LIMIT)
+    ))
+    return [body for chunk in chunks for body in chunk]
+
+def _reactions_url(post_id: str) -> str:
+    return f"{post_id}?fields={_REACTION_FIELDS}"
+
+def _comments_url(video_id: str) -> str:
+    return f"{video_id}/comments?summary=total_count&limit=0"
+
+def _summary_count(body: dict) -> int:
+    return body.get("summary", {}).get("total_count", 0)
+
+def _reaction_counts(body: dict) -> dict:
+    return {reaction: _summary_count(body.get(reaction.lower(), {})) for reaction in _REACTION_TYPES}
+
 async def get_pages_of_user(user:User)-> dict[str,Any]:
+    key = _pages_cache_key(user)
+    cached = _cache_get(_user_pages_cache, key)
+    if cached is not None:
+        return cached
     try:
-        user = await collection.find_one({"_id":ObjectId(user.id)})
+        # Only the Facebook pages leave the database, with their access tokens already removed
+        pipeline = [
+            {"$match": {"_id": ObjectId(user.id)}},
+            {"$project": {
+                "_id": 0,
+                "has_facebook": {"$gt": ["$social_credentials.facebook", None]},
+                "pages": "$social_credentials.facebook.pages"
+            }},
+            {"$unset": "pages.access_token"}
+        ]
+        user = None
+        async for doc in collection.aggregate(pipeline):
+            user = doc
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
-        if not user.get('social_credentials') or 'facebook' not in user['social_credentials']:
+        if not user.get('has_facebook'):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="User does not have Facebook credentials"
             )
-        facebook_credentials = user['social_credentials']['facebook']
-        if not facebook_credentials.get('pages'):
+        pages = user.get('pages')
+        if not pages:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="No Facebook pages found for the user"
             )
-        pages = [
-            {k:v for k,v in page.items() if k!="access_token"}
-            for page in facebook_credentials['pages']
-        ]
+        _cache_put(_user_pages_cache, key, {"pages": pages})
         return {"pages": pages}
     except HTTPException as e:
         raise HTTPException(
@@ -263,18 +415,13 @@ async def get_pages_of_user(user:User)-> dict[str,Any]:
         )
     
 
-from typing import List, Any
-from datetime import datetime
-from fastapi import HTTPException
-import requests
-
 async def get_top_facebook_videos_by_stat(user: User, start_date: datetime, end_date: datetime, type_sta: str, max_results: int = 10) -> List[dict[str, Any]]:
     try:
         type_sta = type_sta+"s"
         if type_sta =="likes":
             type_sta = "reactions"
         access_token = await check_facebook_credentials(user)
-        facebook_pages = user.social_credentials.get('facebook', {}).get('pages', [])
+        facebook_pages = _facebook_pages(user)
         if not facebook_pages:
             raise HTTPException(status_code=404, detail="No Facebook pages found for user")
 
@@ -287,59 +434,76 @@ async def get_top_facebook_videos_by_stat(user: User, start_date: datetime, end_
         if not page_access_token:
             raise HTTPException(status_code=400, detail="Page access token not found")
 
-        videos = []
-        next_page = None
+        if type_sta not in ("views", "comments", "reactions"):
+            raise HTTPException(status_code=400, detail="Invalid statistic type")
+
+        url = f"https://graph.facebook.com/v23.0/{page_id}/videos"
 
-        while True:
-            url = f"https://graph.facebook.com/v23.0/{page_id}/videos"
+        async def fetch_page(cursor):
             params = {
                 "access_token": page_access_token,
                 "limit": 50,
                 "fields": "id,created_time,title,description,permalink_url,views"
             }
-            if next_page:
-                params["after"] = next_page
+            if cursor:
+                params["after"] = cursor
 
-            response = requests.get(url, params=params).json()
+            response = orjson.loads((await _graph_request("GET", url, params=params)).content)
 
             if "error" in response:
                 raise HTTPException(status_code=400, detail=f"Error: {response['error']['message']}")
 
-            for item in response.get('data', []):
-                created_at = parse(item['created_time'])
-                if start_date <= created_at <= end_date:
-                    video_id = item.get("id")
-                    title = item.get("title", "")
-                    count = 0
-
-                    # Lấy số liệu tương ứng
-                    if type_sta == "views":
-                        count = int(item.get("views", 0))
-                    elif type_sta == "comments":
-                        count = await get_video_comments(video_id, page_access_token)
-                    elif type_sta == "reactions":
-                        reactions = await get_video_creations(f"{page_id}_{video_id}", page_access_token)
-                        count = sum(reactions.values())
-                    else:
-                        raise HTTPException(status_code=400, detail="Invalid statistic type")
-
-                    videos.append({
-                         "platform": "facebook",
-                        'title': title,
-                        'count': count
-                    })
-
             paging = response.get('paging', {})
-            next_page = paging.get('cursors', {}).get('after')
-            if not next_page:
-                break
+            return response.get('data', []), paging.get('cursors', {}).get('after')
+
+        # Min-heap of the best max_results videos so far: (count, -arrival order, title);
+        # on equal counts the earlier video wins, as with a stable sort
+        top_videos = []
+        arrival = 0
+        next_task = asyncio.create_task(fetch_page(None))
+
+        try:
+            while next_task:
+                data, next_page = await next_task
+                # Download the next page while this page's stats are being fetched
+                next_task = asyncio.create_task(fetch_page(next_page)) if next_page else None
 
-        if not videos:
-            return []
+                items = [
+                    item for item in data
+                    if start_date <= datetime.fromisoformat(item['created_time']) <= end_date
+                ]
+
+                # Lấy số liệu tương ứng
+                if type_sta == "views":
+                    # Views come with the page; drop videos that can't enter a full top list
+                    if len(top_videos) >= max_results > 0:
+                        items = [item for item in items if int(item.get("views", 0)) > top_videos[0][0]]
+                    counts = [int(item.get("views", 0)) for item in items]
+                elif type_sta == "comments":
+                    stats = await graph_batch(page_access_token, [_comments_url(item.get("id")) for item in items])
+                    counts = [_summary_count(body) for body in stats]
+                else:
+                    stats = await graph_batch(page_access_token, [
+                        _reactions_url(f"{page_id}_{item.get('id')}") for item in items
+                    ])
+                    counts = [sum(_reaction_counts(body).values()) for body in stats]
+
+                for item, count in zip(items, counts):
+                    entry = (count, -arrival, item.get("title", ""))
+                    arrival += 1
+                    if len(top_videos) < max_results:
+                        heapq.heappush(top_videos, entry)
+                    elif top_videos and entry > top_videos[0]:
+                        heapq.heapreplace(top_videos, entry)
+        finally:
+            if next_task:
+                next_task.cancel()
 
         # Sắp xếp giảm dần theo count
-        videos.sort(key=lambda v: v['count'], reverse=True)
-        return videos[:max_results]
+        return [
+            {"platform": "facebook", 'title': title, 'count': count}
+            for count, _, title in sorted(top_videos, reverse=True)
+        ]
 
     except HTTPException as e:
         raise e
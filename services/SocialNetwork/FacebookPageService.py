@@ -1,12 +1,16 @@
-import requests
+import httpx
 import logging
+import orjson
 from typing import List, Dict, Any, Optional
 from models.user import User
 from schemas.social import FacebookPageResponse, FacebookPageListResponse
 from config import FACEBOOK_APP_ID, FACEBOOK_APP_SECRET, FACEBOOK_REDIRECT_URI
+from .Facebook import _graph_request
 
 logger = logging.getLogger(__name__)
 
+_VIDEO_INFO_FIELDS = 'id,title,description,created_time,permalink_url,status,length'
+
 class FacebookPageService:
     def __init__(self):
         self.base_url = "https://graph.facebook.com/v18.0"
@@ -51,10 +55,10 @@ class FacebookPageService:
                 'fields': 'id,name,access_token,category,about,picture{url},is_published'
             }
             
-            response = requests.get(url, params=params)
+            response = await _graph_request("GET", url, params=params)
             response.raise_for_status()
             
-            data = response.json()
+            data = orjson.loads(response.content)
             pages = []
             
             for page_data in data.get('data', []):
@@ -71,7 +75,7 @@ class FacebookPageService:
             
             return FacebookPageListResponse(pages=pages)
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Error fetching Facebook pages: {str(e)}")
             raise Exception(f"Unable to fetch Facebook pages: {str(e)}")
         except Exception as e:
@@ -101,15 +105,18 @@ class FacebookPageService:
                 'published': True  # Always publish immediately as public
             }
             
-            # Gửi request
-            response = requests.post(url, data=data)
+            # Gửi request, asking for the video details in the same response
+            response = await _graph_request("POST", url, data=data, params={'fields': _VIDEO_INFO_FIELDS})
             response.raise_for_status()
             
-            result = response.json()
+            result = orjson.loads(response.content)
             
-            # Lấy thông tin chi tiết của video vừa upload
+            # Lấy thông tin chi tiết của video vừa upload (only if the upload response didn't include them)
             video_id = result.get('id')
-            video_info = await self.get_video_info(video_id, page_access_token)
+            if 'created_time' in result:
+                video_info = result
+            else:
+                video_info = await self.get_video_info(video_id, page_access_token)
             
             return {
                 'video_id': video_id,
@@ -117,7 +124,7 @@ class FacebookPageService:
                 'upload_success': True
             }
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Error uploading video to Facebook page: {str(e)}")
             raise Exception(f"Unable to upload video to Facebook page: {str(e)}")
         except Exception as e:
@@ -132,15 +139,15 @@ class FacebookPageService:
             url = f"{self.base_url}/{video_id}"
             params = {
                 'access_token': access_token,
-                'fields': 'id,title,description,created_time,permalink_url,status,length'
+                'fields': _VIDEO_INFO_FIELDS
             }
             
-            response = requests.get(url, params=params)
+            response = await _graph_request("GET", url, params=params)
             response.raise_for_status()
             
-            return response.json()
+            return orjson.loads(response.content)
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Error getting video info: {str(e)}")
             return {}
     
@@ -155,10 +162,10 @@ class FacebookPageService:
                 'metric': 'post_video_views,post_reactions_by_type_total,post_video_complete_views_30s'
             }
             
-            response = requests.get(url, params=params)
+            response = await _graph_request("GET", url, params=params)
             response.raise_for_status()
             
-            data = response.json()
+            data = orjson.loads(response.content)
             stats = {}
             
             for metric in data.get('data', []):
@@ -175,7 +182,7 @@ class FacebookPageService:
             
             return stats
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Error getting video stats: {str(e)}")
             return {}
     
@@ -189,12 +196,12 @@ class FacebookPageService:
                 'access_token': access_token
             }
             
-            response = requests.delete(url, params=params)
+            response = await _graph_request("DELETE", url, params=params)
             response.raise_for_status()
             
-            result = response.json()
+            result = orjson.loads(response.content)
             return result.get('success', False)
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Error deleting video: {str(e)}")
             return False
@@ -3,101 +3,87 @@ from models import User
 from schemas import VideoUpLoadRequest,SocialPlatform
 from services.SocialNetwork import upload_video_to_youtube,get_youtube_video_stats
 from .Youtube import upload_video_to_youtube, get_youtube_video_stats,get_top_youtube_videos_by_views_and_date
-from .Facebook import upload_video_to_facebook, get_facebook_video_stats,get_pages_of_user,get_top_facebook_videos_by_stat
+from .Facebook import upload_video_to_facebook, get_facebook_video_stats,get_pages_of_user,get_top_facebook_videos_by_stat,_facebook_pages
 from .TikTok import upload_video_to_tiktok,get_list_of_tiktok_videos,get_tiktok_video_stats,get_top_tiktok_videos_by_stats_and_date
 from datetime import datetime
-async def upload_video(user:User,upload_request:VideoUpLoadRequest):
-    if upload_request.platform == SocialPlatform.GOOGLE:
-        if not user.social_credentials or 'google' not in user.social_credentials:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Google credentials are not available for the user."
-            )
-        return await upload_video_to_youtube(user, upload_request)
-    elif upload_request.platform == SocialPlatform.FACEBOOK:
-        if not user.social_credentials or 'facebook' not in user.social_credentials:
+_CREDENTIAL_NAMES = {"google": "Google", "facebook": "Facebook", "tiktok": "Tiktok"}
+
+def _require_credentials(user:User,credential_key:str):
+    if not user.social_credentials or credential_key not in user.social_credentials:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{_CREDENTIAL_NAMES[credential_key]} credentials are not available for the user."
+        )
+
+async def _upload_video_to_facebook_page(user:User,upload_request:VideoUpLoadRequest):
+    # Get page_id from request, if not provided use first page from user credentials
+    facebook_pages = _facebook_pages(user)
+    page_id = upload_request.page_id
+    if not page_id:
+        if not facebook_pages:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Facebook credentials are not available for the user."
+                detail="No Facebook pages found. Please specify page_id or link your Facebook pages."
             )
+        page_id = facebook_pages[0].get('id')
+    page = next((p for p in facebook_pages if p.get('id') == page_id), {})
         
-        # Get page_id from request, if not provided use first page from user credentials
-        page_id = upload_request.page_id
-        if not page_id:
-            facebook_pages = user.social_credentials.get('facebook', {}).get('pages', [])
-            if not facebook_pages:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="No Facebook pages found. Please specify page_id or link your Facebook pages."
-                )
-            page_id = facebook_pages[0].get('id')
-            
-        return await upload_video_to_facebook(user, page_id, upload_request)
+    return await upload_video_to_facebook(user, page_id, upload_request, page)
+
+# Platform -> (credential key, handler)
+_UPLOAD_HANDLERS = {
+    SocialPlatform.GOOGLE: ("google", upload_video_to_youtube),
+    SocialPlatform.FACEBOOK: ("facebook", _upload_video_to_facebook_page),
+    SocialPlatform.TIKTOK: ("tiktok", upload_video_to_tiktok),
+}
+# Only Facebook stats are scoped to a page
+_STATS_HANDLERS = {
+    SocialPlatform.GOOGLE: lambda user, video_id, page_id: get_youtube_video_stats(user, video_id),
+    SocialPlatform.FACEBOOK: get_facebook_video_stats,
+    SocialPlatform.TIKTOK: lambda user, video_id, page_id: get_tiktok_video_stats(user, video_id),
+}
+_INFO_HANDLERS = {
+    SocialPlatform.TIKTOK: ("tiktok", get_list_of_tiktok_videos),
+    SocialPlatform.FACEBOOK: ("facebook", get_pages_of_user),
+}
+_TOP_VIDEO_HANDLERS = {
+    SocialPlatform.GOOGLE: ("google", get_top_youtube_videos_by_views_and_date),
+    SocialPlatform.FACEBOOK: ("facebook", get_top_facebook_videos_by_stat),
+    SocialPlatform.TIKTOK: ("tiktok", get_top_tiktok_videos_by_stats_and_date),
+}
+
+async def upload_video(user:User,upload_request:VideoUpLoadRequest):
+    handler = _UPLOAD_HANDLERS.get(upload_request.platform)
+    if handler is None:
+        return None
+    credential_key, upload = handler
+    _require_credentials(user, credential_key)
+    return await upload(user, upload_request)
 
-        # return await upload_video_to_facebook(user,upload_request.page_id, upload_request)
-    elif upload_request.platform == SocialPlatform.TIKTOK:
-        if not user.social_credentials or 'tiktok' not in user.social_credentials:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Tiktok credentials are not available for the user."
-            )
-        return await upload_video_to_tiktok(user, upload_request)
 async def get_video_stats(user:User,video_id:str,platform:SocialPlatform,page_id:str=None):
-    if platform==SocialPlatform.GOOGLE:
-        return await get_youtube_video_stats(user, video_id)
-    elif platform==SocialPlatform.FACEBOOK:
-        return await get_facebook_video_stats(user, video_id,page_id)
-    elif platform==SocialPlatform.TIKTOK:
-        return await get_tiktok_video_stats(user, video_id)
+    get_stats = _STATS_HANDLERS.get(platform)
+    if get_stats is None:
+        return None
+    return await get_stats(user, video_id, page_id)
 
 async def get_more_info_social_networks(user:User,platform:SocialPlatform):
-    if platform ==SocialPlatform.TIKTOK:
-        if not user.social_credentials or 'tiktok' not in user.social_credentials:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Tiktok credentials are not available for the user."
-            )
-        return await get_list_of_tiktok_videos(user)
-    elif platform == SocialPlatform.FACEBOOK:
-        if not user.social_credentials or 'facebook' not in user.social_credentials:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Facebook credentials are not available for the user."
-            )
-        return await get_pages_of_user(user)
-    else:
+    handler = _INFO_HANDLERS.get(platform)
+    if handler is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Platform {platform} is not supported for fetching more info."
         )
+    credential_key, get_info = handler
+    _require_credentials(user, credential_key)
+    return await get_info(user)
     
 async def get_top_video(user:User,start_date:datetime,end_date:datetime,type_sta:str,platform:SocialPlatform,max_results):
-    if platform ==SocialPlatform.GOOGLE:
-        if not user.social_credentials or 'google' not in user.social_credentials:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Google credentials are not available for the user."
-            )
-        return await get_top_youtube_videos_by_views_and_date(user,start_date,end_date,type_sta, max_results)
-    elif platform == SocialPlatform.FACEBOOK:
-        if not user.social_credentials or 'facebook' not in user.social_credentials:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Facebook credentials are not available for the user."
-            )
-        return await get_top_facebook_videos_by_stat(user,start_date,end_date,type_sta, max_results)
-    elif platform == SocialPlatform.TIKTOK:
-        if not user.social_credentials or 'tiktok' not in user.social_credentials:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=" credentials are not available for the user."
-            )
-        return await get_top_tiktok_videos_by_stats_and_date(user,start_date,end_date,type_sta, max_results)
-    else:
+    handler = _TOP_VIDEO_HANDLERS.get(platform)
+    if handler is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Platform {platform} is not supported for fetching more info."
         )
-
-    
-        
\ No newline at end of file
+    credential_key, get_top = handler
+    _require_credentials(user, credential_key)
+    return await get_top(user,start_date,end_date,type_sta, max_results)
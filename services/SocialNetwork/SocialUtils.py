@@ -1,44 +1,59 @@
 from schemas import SocialPlatform
 from config import social_collection
 from models import Social,SocialVideoCreate
+from pymongo.errors import DuplicateKeyError
 collection = social_collection()
+_SOCIAL_VIDEO_KEYS = [("user_id", 1), ("video_id", 1)]
+_SOCIAL_VIDEO_INDEX = "user_id_1_video_id_1"
+
+async def _has_duplicate_social_videos() -> bool:
+    duplicates = await collection.aggregate([
+        {"$group": {"_id": {"user_id": "$user_id", "video_id": "$video_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": 1}
+    ]).to_list(1)
+    return bool(duplicates)
+
+async def ensure_social_indexes():
+    """Unique (user_id, video_id) index: used by every social video read and write, and keeps two
+    concurrent first uploads of a video from creating two documents"""
+    try:
+        if await _has_duplicate_social_videos():
+            # The unique index can't be built until these are merged; keep lookups indexed meanwhile
+            print("Social videos contain duplicate (user_id, video_id) documents; skipping the unique index")
+            await collection.create_index(_SOCIAL_VIDEO_KEYS)
+            return
+        index = (await collection.index_information()).get(_SOCIAL_VIDEO_INDEX)
+        if index is not None and not index.get("unique"):
+            # Replace the earlier non-unique index; same keys with different options can't be created over it
+            await collection.drop_index(_SOCIAL_VIDEO_INDEX)
+        await collection.create_index(_SOCIAL_VIDEO_KEYS, unique=True)
+    except Exception as e:
+        print(f"Error creating social indexes: {e}")
 async def add_social_video(social_create: SocialVideoCreate):
     try:
-        exitsing_social =await collection.find_one({"user_id": social_create.user_id,"video_id": social_create.video_id })
-        if not exitsing_social:
-            new_social = None
-            if social_create.platform == SocialPlatform.FACEBOOK:
-                new_social = Social(
-                    user_id=social_create.user_id,
-                    video_id = social_create.video_id,
-                    facebook=[{
-                        "video_url": social_create.video_url,
-                        "page_id": social_create.page_id
-                    }]
-                )
-            else:
-                new_social = Social(
-                    user_id=social_create.user_id,
-                    video_id = social_create.video_id,
-                    youtube=[social_create.video_url]
-                )
-            await collection.insert_one(new_social.model_dump(by_alias=True,exclude={"id"}))
+        if social_create.platform == SocialPlatform.FACEBOOK:
+            field = "facebook"
+            entry = {
+                "video_url": social_create.video_url,
+                "page_id": social_create.page_id
+            }
         else:
-            if social_create.platform == SocialPlatform.FACEBOOK:
-                if not exitsing_social.get('facebook'):
-                    exitsing_social['facebook'] = []
-                exitsing_social['facebook'].append({
-                        "video_url": social_create.video_url,
-                        "page_id": social_create.page_id
-                    })
-            else:
-                if not exitsing_social.get('youtube'):
-                    exitsing_social['youtube'] = []
-                exitsing_social['youtube'].append(social_create.video_url)
-            await collection.update_one(
-                {"_id": exitsing_social["_id"]},
-                {"$set": exitsing_social}
-            )
+            field = "youtube"
+            entry = social_create.video_url
+        # One atomic upsert instead of read-modify-write, so concurrent uploads can't drop each other's entries.
+        # Older documents may hold {} instead of a list for the field, so start a fresh list in that case.
+        query = {"user_id": social_create.user_id, "video_id": social_create.video_id}
+        update = [{"$set": {field: {"$concatArrays": [
+            {"$cond": [{"$isArray": f"${field}"}, f"${field}", []]},
+            [{"$literal": entry}]
+        ]}}}]
+        try:
+            await collection.update_one(query, update, upsert=True)
+        except DuplicateKeyError:
+            # Another upload inserted the document first; the unique index made this upsert lose,
+            # so append to theirs
+            await collection.update_one(query, update, upsert=True)
     except Exception as e:
         print(f"Error adding social video: {e}")
 async def get_social_videos(user_id: str, platform: SocialPlatform,video_id:str) -> dict | None:
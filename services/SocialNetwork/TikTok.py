@@ -1,122 +1,230 @@
 from models import User
 from schemas import VideoUpLoadRequest,TikTokVideoStatsResponse
 from fastapi import HTTPException, status
-from services import check_and_refresh_tiktok_credentials,download_video_media_from_cloud
-import math
+from services import check_and_refresh_tiktok_credentials,forget_tiktok_token,open_video_media_stream,get_media_stream_size,iter_media_stream_chunks
 import httpx
+import logging
+import orjson
 import asyncio
-from typing import Dict,Any,List
+import time
+from typing import Dict,Any,List,Optional,AsyncIterator
+from .http_retry import retry_transient_http,retry_rate_limited_http
+from core.locks import keyed_lock
 from datetime import datetime,timezone
-async def upload_video_to_tiktok(user:User,upload_request:VideoUpLoadRequest)->str:
-    try:
-        access_token = await check_and_refresh_tiktok_credentials(user)
-        video_stream = await download_video_media_from_cloud(upload_request.media_id)
-        if video_stream is None:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Video media not found"
-            )
-        if len(video_stream.getvalue()) == 0:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Video media is empty"
-            )
-        creator_info = await check_creator_info(access_token)
-        init_url = "https://open.tiktokapis.com/v2/post/publish/video/init/"
-        post_info ={
-            "title": upload_request.title,
-            "privacy_level":"SELF_ONLY",
-            "disable_duet":creator_info.get("duet_disabled", False),
-            "disable_comment": creator_info.get("comment_disabled", False),
-            "disable_stitch": creator_info.get("stitch_disabled", False),
-            "video_cover_timestamp_ms":1000
-        }
-        video_size = len(video_stream.getvalue())
-        chunk_size = video_size if video_size < 10485760 else 10485760
-        total_chunk_count = math.ceil(video_size / chunk_size)  # 10 MB per chunk
-        
-        source_info ={
-            "source": "FILE_UPLOAD",
-            "video_size": video_size,
-            "chunk_size": chunk_size,
-            "total_chunk_count": total_chunk_count
-        }
-        init_data ={
-            "post_info": post_info,
-            "source_info": source_info
-        }
-        headers ={
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json; charset=UTF-8"
-        }
-        async with httpx.AsyncClient() as client:
-            response = await client.post(init_url, json=init_data, headers=headers)
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Failed to initialize TikTok video upload: {response.text}"
-            )
-        result = response.json()
 
-        if result.get("error", {}).get("code") != "ok":
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Failed to initialize TikTok video upload: {result.get('error', {}).get('message', 'Unknown error')}"
-            )
-        publish_id = result["data"]["publish_id"]
-        upload_url = result["data"]["upload_url"]
-        video_stream.seek(0)
-        bytes_sent = 0
-        chunk_number = 0
-        async with httpx.AsyncClient() as client:
-            while bytes_sent < video_size:
-                chunk_data = video_stream.read(chunk_size)
-                chunk_len = len(chunk_data)
-                start_byte = bytes_sent
-                end_byte = bytes_sent + chunk_len - 1
-                upload_headers = {
-                    "Content-Type": "video/mp4",
-                    "Content-Length": str(chunk_len),
-                    "Content-Range": f"bytes {start_byte}-{end_byte}/{video_size}"
-                }
-                upload_reponse = await client.put(
+logger = logging.getLogger(__name__)
+
+# Shared TikTok API client so connections (and chunk uploads) reuse one pooled HTTP/2 connection
+_tiktok_client: Optional[httpx.AsyncClient] = None
+
+def _get_tiktok_client() -> httpx.AsyncClient:
+    """Lazily create the shared TikTok API HTTP client"""
+    global _tiktok_client
+    if _tiktok_client is None or _tiktok_client.is_closed:
+        _tiktok_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=30.0),
+            # 10 MB chunk PUTs need far more than httpx's 5 s default
+            timeout=httpx.Timeout(60.0, connect=10.0),
+        )
+    return _tiktok_client
+
+async def close_tiktok_client():
+    """Close the shared TikTok API client (called on application shutdown)"""
+    global _tiktok_client
+    if _tiktok_client is not None:
+        await _tiktok_client.aclose()
+        _tiktok_client = None
+
+@retry_transient_http
+async def _tiktok_request(method: str, url: str, **kwargs) -> httpx.Response:
+    """Send a TikTok API request on the shared client, retrying 429s and transient failures"""
+    return await _get_tiktok_client().request(method, url, **kwargs)
+
+@retry_rate_limited_http
+async def _tiktok_create_request(method: str, url: str, **kwargs) -> httpx.Response:
+    """Send a TikTok request that creates something, retrying only 429s and failed connects"""
+    return await _get_tiktok_client().request(method, url, **kwargs)
+
+# Publish status polling: up to 8 checks, waiting 1 s, 2 s, 4 s ... between them (at most 30 s)
+_STATUS_POLL_ATTEMPTS = 8
+_STATUS_POLL_MAX_DELAY_SECONDS = 30
+
+# Creator settings (duet/comment/stitch) rarely change, so reuse them for a few minutes per token
+_CREATOR_INFO_TTL_SECONDS = 300
+_CREATOR_INFO_CACHE_SIZE = 1024
+_creator_info_cache: Dict[str, tuple] = {}
+# One lock per token so concurrent uploads on a cold cache make a single creator_info call
+_creator_info_locks: Dict[str, asyncio.Lock] = {}
+
+_UPLOAD_INIT_URL = "https://open.tiktokapis.com/v2/post/publish/video/init/"
+# 10 MB per chunk (smaller videos go up as a single chunk)
+_UPLOAD_CHUNK_SIZE = 10 * 1024 * 1024
+
+# Chunk PUTs in flight per upload, and across all uploads to the TikTok upload host
+_CHUNK_UPLOAD_CONCURRENCY = 6
+_TIKTOK_UPLOAD_HOST_LIMIT = asyncio.Semaphore(32)
+
+_CHUNK_CONTENT_TYPE = "video/mp4"
+_OK_STATUS = frozenset((200, 201, 202))
+
+async def _upload_chunks(upload_url: str, chunks: AsyncIterator[bytes], video_size: int):
+    """PUT chunks to TikTok as they arrive, with up to _CHUNK_UPLOAD_CONCURRENCY in flight"""
+    chunk_limit = asyncio.Semaphore(_CHUNK_UPLOAD_CONCURRENCY)
+
+    async def put_chunk(chunk_number: int, start_byte: int, chunk_data: bytes):
+        try:
+            chunk_len = len(chunk_data)
+            end_byte = start_byte + chunk_len - 1
+            # Each concurrent PUT needs its own dict, since Content-Range differs per chunk
+            upload_headers = {
+                "Content-Type": _CHUNK_CONTENT_TYPE,
+                "Content-Length": str(chunk_len),
+                "Content-Range": f"bytes {start_byte}-{end_byte}/{video_size}"
+            }
+            async with _TIKTOK_UPLOAD_HOST_LIMIT:
+                upload_reponse = await _tiktok_request(
+                    "PUT",
                     upload_url,
                     content=chunk_data,
                     headers=upload_headers
                 )
-                if upload_reponse.status_code not in [200, 201, 202]:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=f"Failed to upload video chunk {chunk_number + 1}: {upload_reponse.text}"
-                    )
-                bytes_sent += chunk_len
-                chunk_number += 1
+            if upload_reponse.status_code not in _OK_STATUS:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Failed to upload video chunk {chunk_number + 1}: {upload_reponse.text}"
+                )
+        finally:
+            chunk_limit.release()
+
+    tasks = []
+    start_byte = 0
+    try:
+        async for chunk_data in chunks:
+            # Wait for a free slot before taking the next chunk, so only a few chunks are held in memory
+            await chunk_limit.acquire()
+            failed = next((task for task in tasks if task.done() and task.exception()), None)
+            if failed:
+                chunk_limit.release()
+                raise failed.exception()
+            # Chunks carry their own Content-Range, so they can be in flight at the same time
+            tasks.append(asyncio.create_task(put_chunk(len(tasks), start_byte, chunk_data)))
+            start_byte += len(chunk_data)
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def upload_video_to_tiktok(user:User,upload_request:VideoUpLoadRequest)->str:
+    try:
+        access_token = await check_and_refresh_tiktok_credentials(user)
+        async with open_video_media_stream(upload_request.media_id) as media_response:
+            if media_response is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Video media not found"
+                )
+            # The upload needs the size up front; the body is only read into memory when it can't be trusted
+            video_size, buffer = await get_media_stream_size(media_response)
+            if video_size == 0:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Video media is empty"
+                )
+            creator_info = await check_creator_info(access_token)
+            post_info ={
+                "title": upload_request.title,
+                "privacy_level":"SELF_ONLY",
+                "disable_duet":creator_info.get("duet_disabled", False),
+                "disable_comment": creator_info.get("comment_disabled", False),
+                "disable_stitch": creator_info.get("stitch_disabled", False),
+                "video_cover_timestamp_ms":1000
+            }
+            chunk_size = min(video_size, _UPLOAD_CHUNK_SIZE)
+            total_chunk_count = -(-video_size // chunk_size)
+            
+            source_info ={
+                "source": "FILE_UPLOAD",
+                "video_size": video_size,
+                "chunk_size": chunk_size,
+                "total_chunk_count": total_chunk_count
+            }
+            init_data ={
+                "post_info": post_info,
+                "source_info": source_info
+            }
+            headers ={
+                "Authorization": f"Bearer {access_token}",
+                "Content-Type": "application/json; charset=UTF-8"
+            }
+            response = await _tiktok_create_request("POST", _UPLOAD_INIT_URL, content=orjson.dumps(init_data), headers=headers)
+            if response.status_code in (401, 403):
+                # Token or permissions changed; don't keep serving the cached creator settings
+                _creator_info_cache.pop(access_token, None)
+                forget_tiktok_token(user)
+            if response.status_code != 200:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Failed to initialize TikTok video upload: {response.text}"
+                )
+            result = orjson.loads(response.content)
+
+            if result.get("error", {}).get("code") != "ok":
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Failed to initialize TikTok video upload: {result.get('error', {}).get('message', 'Unknown error')}"
+                )
+            publish_id = result["data"]["publish_id"]
+            upload_url = result["data"]["upload_url"]
+            # Stream straight from cloud storage to TikTok when the size was known, so download and upload overlap
+            chunks = iter_media_stream_chunks(media_response, buffer, chunk_size)
+            await _upload_chunks(upload_url, chunks, video_size)
         return "No link available for TikTok uploads, video uploaded successfully."
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Failed to upload video to TikTok: {str(e)}"
         )
 async def check_creator_info(access_token: str):
+    cached = _creator_info_cache.get(access_token)
+    if cached is not None and time.monotonic() - cached[0] < _CREATOR_INFO_TTL_SECONDS:
+        return cached[1]
+    # Bounded like the cache; a lock with a query in flight is never evicted
+    async with keyed_lock(_creator_info_locks, access_token, _CREATOR_INFO_CACHE_SIZE):
+        # Another caller may have filled the cache while we waited
+        cached = _creator_info_cache.get(access_token)
+        if cached is not None and time.monotonic() - cached[0] < _CREATOR_INFO_TTL_SECONDS:
+            return cached[1]
+        creator_info = await _query_creator_info(access_token)
+        # Fill the cache before releasing the lock so queued callers find it
+        _creator_info_cache.pop(access_token, None)
+        if len(_creator_info_cache) >= _CREATOR_INFO_CACHE_SIZE:
+            # Dicts keep insertion order, so the first key is the oldest entry
+            _creator_info_cache.pop(next(iter(_creator_info_cache)))
+        _creator_info_cache[access_token] = (time.monotonic(), creator_info)
+        return creator_info
+
+async def _query_creator_info(access_token: str):
     url = "https://open.tiktokapis.com/v2/post/publish/creator_info/query/"
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Content-Type": "application/json; charset=UTF-8"
     }
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, headers=headers)
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Failed to fetch creator info: {response.text}"
-            )
-        result = response.json()
-        if result.get("error", {}).get("code") != "ok":
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Creator info error: {result.get('error', {}).get('message', 'Unknown error')}"
-            )
-        return result["data"]  
+    response = await _tiktok_request("POST", url, headers=headers)
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Failed to fetch creator info: {response.text}"
+        )
+    result = orjson.loads(response.content)
+    if result.get("error", {}).get("code") != "ok":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Creator info error: {result.get('error', {}).get('message', 'Unknown error')}"
+        )
+    return result["data"]  
 
 async def check_status_video_upload(publish_id: str, access_token: str) -> bool:
     try:
@@ -128,65 +236,83 @@ async def check_status_video_upload(publish_id: str, access_token: str) -> bool:
             "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json; charset=UTF-8"
         }
-        max_attempts = 6
-        async with httpx.AsyncClient() as client:
-            for attempt in range(max_attempts):
-                await asyncio.sleep(10)
-                response = await client.post(url, json=data, headers=headers)
-                if response.status_code != 200:
-                    continue
-                result = response.json()
-                if result.get("error", {}).get("code") != "ok":
-                    continue
-                status_value = result["data"]["status"]
-                if status_value == "PUBLISH_COMPLETE":
-                    return True
-            raise HTTPException(
-                status_code=status.HTTP_408_REQUEST_TIMEOUT,
-                detail="Video upload status check timed out after multiple attempts."
-            )
+        # Poll quickly at first and back off (1 s, 2 s, 4 s ... capped at 30 s) instead of a flat 10 s
+        for attempt in range(_STATUS_POLL_ATTEMPTS):
+            await asyncio.sleep(min(_STATUS_POLL_MAX_DELAY_SECONDS, 2 ** attempt))
+            response = await _tiktok_request("POST", url, content=orjson.dumps(data), headers=headers)
+            if response.status_code != 200:
+                continue
+            result = orjson.loads(response.content)
+            if result.get("error", {}).get("code") != "ok":
+                continue
+            status_value = result["data"]["status"]
+            if status_value == "PUBLISH_COMPLETE":
+                return True
+        raise HTTPException(
+            status_code=status.HTTP_408_REQUEST_TIMEOUT,
+            detail="Video upload status check timed out after multiple attempts."
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error checking video upload status: {str(e)}"
         )
+async def _iter_tiktok_video_pages(access_token: str) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Yield the user's video list page by page
+    
+    The next page is requested as soon as a page arrives, so it downloads while the caller handles this one
+    """
+    url = "https://open.tiktokapis.com/v2/video/list/?fields=id"
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json; charset=UTF-8"
+    }
+
+    async def fetch_page(cursor):
+        data = {
+            "max_count": 20,
+        }
+        if cursor:
+            data["cursor"] = cursor
+        response = await _tiktok_request("POST", url, content=orjson.dumps(data), headers=headers)
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Failed to fetch TikTok videos: {response.text}"
+            )
+        result = orjson.loads(response.content)
+        if result.get("error", {}).get("code") != "ok":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Error fetching TikTok videos: {result.get('error', {}).get('message', 'Unknown error')}"
+            )
+        return result["data"]
+
+    next_task = asyncio.create_task(fetch_page(None))
+    try:
+        while next_task:
+            data = await next_task
+            # The cursor is only known once a page is parsed; request the next page before handing this one over
+            next_task = asyncio.create_task(fetch_page(data.get("cursor"))) if data.get("has_more", False) else None
+            yield data.get("videos", [])
+    finally:
+        if next_task:
+            next_task.cancel()
+
 async def get_list_of_tiktok_videos(user: User) -> Dict[str, Any]:
     try:
         access_token = await check_and_refresh_tiktok_credentials(user)
-        url = "https://open.tiktokapis.com/v2/video/list/?fields=id"
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json; charset=UTF-8"
-        }
-        cursor = None
         all_videos = []
-        async with httpx.AsyncClient() as client:
-            while True:
-                data = {
-                    "max_count": 20,
-                }
-                if cursor:
-                    data["cursor"] = cursor
-                response = await client.post(url, json=data, headers=headers)
-                if response.status_code != 200:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=f"Failed to fetch TikTok videos: {response.text}"
-                    )
-                result = response.json()
-                if result.get("error", {}).get("code") != "ok":
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=f"Error fetching TikTok videos: {result.get('error', {}).get('message', 'Unknown error')}"
-                    )
-                data =result["data"]
-                all_videos.extend(data.get("videos", []))
-                if not data.get("has_more", False):
-                    break
-                cursor = data.get("cursor")
+        async for videos in _iter_tiktok_video_pages(access_token):
+            all_videos.extend(videos)
         return {
             "videos": all_videos,
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -194,34 +320,46 @@ async def get_list_of_tiktok_videos(user: User) -> Dict[str, Any]:
         )
     
 
-async def get_tiktok_video_stats(user: User, video_id: str) -> TikTokVideoStatsResponse:
-    try:
-        access_token = await check_and_refresh_tiktok_credentials(user)
-        url = "https://open.tiktokapis.com/v2/video/query/?fields=title,video_description,share_url,create_time,view_count,like_count,comment_count,share_count,cover_image_url"
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json; charset=UTF-8"
-        }
-        data ={
-            "filters": {
-                "video_ids": [video_id]
-            }
-        }
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=data, headers=headers)
+_VIDEO_QUERY_URL = "https://open.tiktokapis.com/v2/video/query/"
+# /v2/video/query/ accepts at most 20 video ids per request
+_VIDEO_QUERY_BATCH_SIZE = 20
+_VIDEO_STATS_FIELDS = "id,title,video_description,share_url,create_time,view_count,like_count,comment_count,share_count,cover_image_url"
+
+async def _query_tiktok_videos(access_token: str, video_ids: List[str], fields: str) -> List[Dict[str, Any]]:
+    """Query videos in batches of 20 ids (batches run concurrently); returns the videos TikTok found"""
+    url = f"{_VIDEO_QUERY_URL}?fields={fields}"
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json; charset=UTF-8"
+    }
+
+    async def query(batch: List[str]) -> List[Dict[str, Any]]:
+        response = await _tiktok_request("POST", url, content=orjson.dumps({"filters": {"video_ids": batch}}), headers=headers)
         if response.status_code != 200:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to fetch TikTok video stats: {response.text}"
             )
-        result = response.json()
+        result = orjson.loads(response.content)
         if result.get("error", {}).get("code") != "ok":
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error fetching TikTok video stats: {result.get('error', {}).get('message', 'Unknown error')}"
             )
-        video_data = result["data"]["videos"][0] 
-        return TikTokVideoStatsResponse(
+        return result["data"].get("videos", [])
+
+    batches = await asyncio.gather(*(
+        query(video_ids[start:start + _VIDEO_QUERY_BATCH_SIZE])
+        for start in range(0, len(video_ids), _VIDEO_QUERY_BATCH_SIZE)
+    ))
+    return [video for batch in batches for video in batch]
+
+async def get_tiktok_video_stats_batch(user: User, video_ids: List[str]) -> Dict[str, TikTokVideoStatsResponse]:
+    """Stats for several TikTok videos, keyed by video id (ids TikTok doesn't return are left out)"""
+    access_token = await check_and_refresh_tiktok_credentials(user)
+    videos = await _query_tiktok_videos(access_token, video_ids, _VIDEO_STATS_FIELDS)
+    return {
+        video_data.get('id'): TikTokVideoStatsResponse(
             platform='tiktok',
             title=video_data.get('title', ''),
             description=video_data.get('video_description', ''),
@@ -233,6 +371,18 @@ async def get_tiktok_video_stats(user: User, video_id: str) -> TikTokVideoStatsR
             comment_count=int(video_data.get('comment_count', 0)),
             cover_image_url=video_data.get('cover_image_url', '')
         )
+        for video_data in videos
+    }
+
+async def get_tiktok_video_stats(user: User, video_id: str) -> TikTokVideoStatsResponse:
+    try:
+        stats = await get_tiktok_video_stats_batch(user, [video_id])
+        if video_id not in stats:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Video not found"
+            )
+        return stats[video_id]
     except HTTPException as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -242,52 +392,33 @@ async def get_tiktok_video_stats(user: User, video_id: str) -> TikTokVideoStatsR
 
 async def get_top_tiktok_videos_by_stats_and_date(user, start_date, end_date, type_sta, max_results=10) -> List[Dict[str, Any]]:
     try:
-        print("degggg")
         type_sta = type_sta +"_count"
         access_token = await check_and_refresh_tiktok_credentials(user)
-        url = "https://open.tiktokapis.com/v2/video/query/?fields=id,title,create_time,share_url,view_count,like_count,comment_count"
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json; charset=UTF-8"
-        }
 
         # Lấy danh sách video IDs từ list API
-        all_videos = await get_list_of_tiktok_videos(user)
-        video_ids = [v["id"] for v in all_videos.get("videos", [])]
-        if not video_ids:
-            return []
-
-        data = {
-            "filters": {
-                "video_ids": video_ids
-            }
-        }
-
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=data, headers=headers)
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to fetch TikTok video stats: {response.text}"
-            )
-
-        result = response.json()
-        if result.get("error", {}).get("code") != "ok":
-            raise HTTPException(
-                status_code=500,
-                detail=f"Error fetching TikTok video stats: {result.get('error', {}).get('message', 'Unknown error')}"
-            )
-
-        videos = result["data"].get("videos", [])
+        # Each page (20 ids, one query batch) is queried while the next page is still being listed
+        query_tasks = []
+        try:
+            async for page in _iter_tiktok_video_pages(access_token):
+                video_ids = [v["id"] for v in page]
+                if video_ids:
+                    query_tasks.append(asyncio.create_task(_query_tiktok_videos(
+                        access_token, video_ids, "id,title,create_time,share_url,view_count,like_count,comment_count"
+                    )))
+            batches = await asyncio.gather(*query_tasks)
+        finally:
+            for task in query_tasks:
+                task.cancel()
+        videos = [video for batch in batches for video in batch]
         if not videos:
             return []
-        print("Videos:", videos)
+        logger.debug("Fetched %d TikTok videos", len(videos))
         # Lọc theo khoảng ngày (sửa lỗi timezone)
         filtered_videos = [
             v for v in videos
             if start_date <= datetime.utcfromtimestamp(v["create_time"]).replace(tzinfo=timezone.utc) <= end_date
         ]
-        print("Deggggg",filtered_videos)
+        logger.debug("%d TikTok videos in date range", len(filtered_videos))
         # Sắp xếp giảm dần theo type_sta
         sorted_videos = sorted(
             filtered_videos,
@@ -0,0 +1,70 @@
+import asyncio
+import orjson
+import uuid
+from typing import AsyncIterator
+from fastapi import HTTPException, status
+from models import User
+from schemas import VideoUpLoadRequest
+from .SocialCommon import upload_video
+
+# Uploads run as in-process tasks; finished jobs are kept so clients can still read the result
+_MAX_UPLOAD_JOBS = 1024
+# Comment line sent while an upload is running, so proxies don't drop the idle event stream
+_KEEPALIVE_SECONDS = 15
+_upload_jobs: dict[str, dict] = {}
+
+def _job_state(job_id: str, job: dict) -> dict:
+    task = job["task"]
+    if not task.done():
+        return {"job_id": job_id, "status": "running"}
+    if task.cancelled():
+        return {"job_id": job_id, "status": "failed", "error": "Upload cancelled"}
+    error = task.exception()
+    if error is not None:
+        return {"job_id": job_id, "status": "failed", "error": getattr(error, "detail", str(error))}
+    return {"job_id": job_id, "status": "completed", "result": task.result()}
+
+def _sse_event(state: dict) -> bytes:
+    return b"data: " + orjson.dumps(state) + b"\n\n"
+
+def start_upload_job(user: User, upload_request: VideoUpLoadRequest) -> str:
+    """Start uploading in the background and return the job id to follow it with"""
+    if len(_upload_jobs) >= _MAX_UPLOAD_JOBS:
+        # Dicts keep insertion order, so this drops the oldest finished job
+        finished = next((job_id for job_id, job in _upload_jobs.items() if job["task"].done()), None)
+        if finished is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many uploads in progress, please try again later."
+            )
+        del _upload_jobs[finished]
+    job_id = uuid.uuid4().hex
+    task = asyncio.create_task(upload_video(user, upload_request))
+    # The error is reported through the job's events; mark it retrieved so asyncio doesn't log it as lost
+    task.add_done_callback(lambda done: done.cancelled() or done.exception())
+    _upload_jobs[job_id] = {
+        "user_id": str(user.id),
+        "task": task,
+    }
+    return job_id
+
+def _get_job(user: User, job_id: str) -> dict:
+    job = _upload_jobs.get(job_id)
+    if job is None or job["user_id"] != str(user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload job not found"
+        )
+    return job
+
+async def iter_upload_job_events(user: User, job_id: str) -> AsyncIterator[bytes]:
+    """Server-sent events for an upload job: its state now, then its final state once it finishes"""
+    job = _get_job(user, job_id)
+    yield _sse_event(_job_state(job_id, job))
+    task = job["task"]
+    while not task.done():
+        # wait() neither raises the upload's error nor cancels it when the client disconnects
+        await asyncio.wait({task}, timeout=_KEEPALIVE_SECONDS)
+        if not task.done():
+            yield b": keep-alive\n\n"
+    yield _sse_event(_job_state(job_id, job))
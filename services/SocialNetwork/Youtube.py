@@ -1,22 +1,230 @@
-from services import check_and_refresh_google_credentials,download_video_media_from_cloud
+from config import YT_UPLOAD_CHUNK_SIZE
+from services import check_and_refresh_google_credentials,forget_google_credentials,open_video_media_stream,get_media_stream_size,iter_media_stream_chunks
 from models import User,SocialVideoCreate
 from schemas import VideoUpLoadRequest,GoogleVideoStatsResponse,SocialPlatform
 from googleapiclient.discovery import build,Resource
-from googleapiclient.http import MediaIoBaseUpload
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+from googleapiclient.model import JsonModel
+from google_auth_httplib2 import AuthorizedHttp
+import httplib2
 from fastapi import HTTPException, status
 from .SocialUtils import add_social_video
 from datetime import datetime
-from typing import List,Any
-async def get_youtube_service(user:User) -> Resource:
-    credentials = await check_and_refresh_google_credentials(user)
+from typing import List,Any,Optional,AsyncIterator
+import asyncio
+import heapq
+import httpx
+import orjson
+import random
+import time
+from .http_retry import retry_transient_http,retry_rate_limited_http
+from core.locks import keyed_lock
+
+_YOUTUBE_UPLOAD_URL = "https://www.googleapis.com/upload/youtube/v3/videos"
+# Resumable upload chunks must be a multiple of 256 KiB (except the last one); 8 MiB by default
+_UPLOAD_CHUNK_SIZE = YT_UPLOAD_CHUNK_SIZE
+# Statuses of the final chunk PUT; earlier ones answer 308 (Resume Incomplete)
+_UPLOAD_DONE_STATUS = frozenset((200, 201))
+
+# Shared client for the YouTube upload endpoint so chunk PUTs reuse one pooled connection
+_youtube_client: Optional[httpx.AsyncClient] = None
+
+def _get_youtube_client() -> httpx.AsyncClient:
+    """Lazily create the shared YouTube upload HTTP client"""
+    global _youtube_client
+    if _youtube_client is None or _youtube_client.is_closed:
+        _youtube_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=30.0),
+            timeout=httpx.Timeout(120.0, connect=10.0),
+        )
+    return _youtube_client
+
+@retry_transient_http
+async def _youtube_request(method: str, url: str, **kwargs) -> httpx.Response:
+    """Send a YouTube upload request on the shared client, retrying 429s and transient failures"""
+    return await _get_youtube_client().request(method, url, **kwargs)
+
+@retry_rate_limited_http
+async def _youtube_create_request(method: str, url: str, **kwargs) -> httpx.Response:
+    """Start a YouTube upload session, retrying only 429s and failed connects"""
+    return await _get_youtube_client().request(method, url, **kwargs)
+
+async def close_youtube_client():
+    """Close the shared YouTube upload client (called on application shutdown)"""
+    global _youtube_client
+    if _youtube_client is not None:
+        await _youtube_client.aclose()
+        _youtube_client = None
+
+# videos.list calls in flight at once, to stay clear of YouTube's per-second quota
+_YOUTUBE_LIST_CONCURRENCY = asyncio.Semaphore(10)
+
+# Built YouTube services per user, reused while the access token stays the same
+_SERVICE_CACHE_TTL_SECONDS = 1800
+_SERVICE_CACHE_SIZE = 2048
+_youtube_service_cache: dict[str, tuple[float, str, Resource]] = {}
+_youtube_service_locks: dict[str, asyncio.Lock] = {}
+
+class _OrjsonModel(JsonModel):
+    """googleapiclient's JSON model, decoding responses with orjson instead of the stdlib parser"""
+    def deserialize(self, content):
+        body = orjson.loads(content)
+        if self._data_wrapper and "data" in body:
+            body = body["data"]
+        return body
+
+# Without a timeout a stalled API call would hold its worker thread indefinitely
+_API_TIMEOUT_SECONDS = 30
+
+def _build_youtube_service(credentials) -> Resource:
+    def build_request(http, *args, **kwargs):
+        # httplib2.Http isn't thread-safe and cached services are used from several worker threads,
+        # so every request gets its own
+        return HttpRequest(AuthorizedHttp(credentials, http=httplib2.Http(timeout=_API_TIMEOUT_SECONDS)), *args, **kwargs)
     return build(
         'youtube',
         'v3',
-        credentials=credentials
+        http=AuthorizedHttp(credentials, http=httplib2.Http(timeout=_API_TIMEOUT_SECONDS)),
+        requestBuilder=build_request,
+        model=_OrjsonModel(),
+        # Use the discovery document bundled with googleapiclient instead of fetching it
+        static_discovery=True,
+        cache_discovery=False
+    )
+
+# Response masks so YouTube only sends the fields we read (snippet also carries thumbnails, tags, ...).
+# Top videos keep all of statistics since the counter is picked by type_sta
+_VIDEO_STATS_FIELDS = "items(id,snippet(title,description,publishedAt),statistics(viewCount,likeCount,commentCount))"
+_TOP_VIDEO_FIELDS = "items(snippet/title,statistics)"
+
+# Retries googleapiclient makes itself, with exponential backoff, on 5xx, 429, rate-limit 403s
+# and connection errors
+_API_NUM_RETRIES = 4
+
+async def _execute(request: HttpRequest):
+    """Run a YouTube API request in a worker thread so its retries and backoff sleeps stay off the event loop"""
+    return await asyncio.to_thread(request.execute, num_retries=_API_NUM_RETRIES)
+
+def _forget_youtube_service(user:User, error:Exception):
+    """Drop the cached service when Google rejects its credentials"""
+    # HTTPException 401s come from the resumable upload, which talks to YouTube over httpx
+    if (isinstance(error, HttpError) and error.resp.status == 401) or (
+        isinstance(error, HTTPException) and error.status_code == status.HTTP_401_UNAUTHORIZED
+    ):
+        _youtube_service_cache.pop(str(user.id), None)
+        forget_google_credentials(user)
+
+async def get_youtube_service(user:User) -> Resource:
+    credentials = await check_and_refresh_google_credentials(user)
+    key = str(user.id)
+    cached = _youtube_service_cache.get(key)
+    # A refreshed token replaces the user's entry instead of sitting next to it
+    if cached is not None and cached[1] == credentials.token and time.monotonic() - cached[0] < _SERVICE_CACHE_TTL_SECONDS:
+        return cached[2]
+    # Concurrent calls on a cold or stale entry wait for a single build instead of each building one
+    async with keyed_lock(_youtube_service_locks, key, _SERVICE_CACHE_SIZE):
+        cached = _youtube_service_cache.get(key)
+        if cached is not None and cached[1] == credentials.token and time.monotonic() - cached[0] < _SERVICE_CACHE_TTL_SECONDS:
+            return cached[2]
+        # build() parses the discovery document; keep that off the event loop
+        service = await asyncio.to_thread(_build_youtube_service, credentials)
+        _youtube_service_cache.pop(key, None)
+        if len(_youtube_service_cache) >= _SERVICE_CACHE_SIZE:
+            _youtube_service_cache.pop(next(iter(_youtube_service_cache)))
+        _youtube_service_cache[key] = (time.monotonic(), credentials.token, service)
+        return service
+
+# Consecutive failed chunk PUTs (transport errors, 429/5xx) tolerated before giving up on the upload
+_CHUNK_MAX_FAILURES = 5
+_CHUNK_RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+def _upload_error(response: httpx.Response, detail: str) -> HTTPException:
+    """A failed upload request; 401 is kept so the caller drops the rejected credentials"""
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED if response.status_code == 401 else status.HTTP_400_BAD_REQUEST,
+        detail=detail
     )
+
+def _confirmed_upload_bytes(response: httpx.Response) -> int:
+    """Bytes YouTube has stored so far, from a 308's Range header ("bytes=0-N"; absent when nothing is)"""
+    stored_range = response.headers.get("range")
+    if not stored_range:
+        return 0
+    return int(stored_range.rsplit("-", 1)[1]) + 1
+
+async def _upload_resumable(upload_url: str, auth_header: dict, chunks: AsyncIterator[bytes], video_size: int) -> dict:
+    """
+    PUT the video to a resumable upload session and return the created video resource
+
+    Chunks go up in order. After every 308 the upload resumes from the byte after the last one YouTube
+    confirmed, so a partly stored chunk has its unconfirmed tail sent again. After a transport error or a
+    429/5xx the session's status is queried first instead of blindly resending the same range
+    """
+    offset = 0  # bytes YouTube has confirmed
+    pending = bytearray()  # bytes from offset on that aren't confirmed yet
+    exhausted = False
+    failures = 0
+    # Chunks go up one at a time, so a single headers dict is reused with its range updated
+    chunk_headers = {**auth_header, "Content-Range": ""}
+    while True:
+        while len(pending) < _UPLOAD_CHUNK_SIZE and not exhausted:
+            try:
+                pending += await anext(chunks)
+            except StopAsyncIteration:
+                exhausted = True
+        if not pending:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"YouTube upload stopped at byte {offset} of {video_size}"
+            )
+        chunk_data = bytes(pending[:_UPLOAD_CHUNK_SIZE])
+        chunk_headers["Content-Range"] = f"bytes {offset}-{offset + len(chunk_data) - 1}/{video_size}"
+        try:
+            # Not retried by the client: a resend has to start from what YouTube actually stored
+            chunk_response = await _get_youtube_client().request("PUT", upload_url, content=chunk_data, headers=chunk_headers)
+        except httpx.TransportError:
+            chunk_response = None
+
+        if chunk_response is not None and chunk_response.status_code in _UPLOAD_DONE_STATUS:
+            return orjson.loads(chunk_response.content)
+        if chunk_response is not None and chunk_response.status_code == 308:
+            failures = 0
+        elif chunk_response is None or chunk_response.status_code in _CHUNK_RETRY_STATUSES:
+            failures += 1
+            if failures > _CHUNK_MAX_FAILURES:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Failed to upload video chunk at byte {offset}: "
+                           f"{chunk_response.text if chunk_response is not None else 'connection error'}"
+                )
+            await asyncio.sleep(min(30, 2 ** failures) + random.random())
+            # Ask the session how much it has before sending anything again
+            chunk_response = await _youtube_request(
+                "PUT",
+                upload_url,
+                headers={**auth_header, "Content-Range": f"bytes */{video_size}"}
+            )
+            if chunk_response.status_code in _UPLOAD_DONE_STATUS:
+                return orjson.loads(chunk_response.content)
+            if chunk_response.status_code != 308:
+                raise _upload_error(chunk_response, f"Failed to query YouTube upload status: {chunk_response.text}")
+        else:
+            raise _upload_error(chunk_response, f"Failed to upload video chunk at byte {offset}: {chunk_response.text}")
+        confirmed = _confirmed_upload_bytes(chunk_response)
+        if confirmed < offset:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"YouTube upload session lost data after byte {confirmed}"
+            )
+        # Drop what YouTube now has; anything after it stays pending and is sent again
+        del pending[:confirmed - offset]
+        offset = confirmed
+
 async def upload_video_to_youtube(user:User,upload_request:VideoUpLoadRequest)->str:
     try:
-        youtube_service = await get_youtube_service(user)
+        credentials = await check_and_refresh_google_credentials(user)
         body={
             'snippet': {
                 'title': upload_request.title,
@@ -28,30 +236,45 @@ async def upload_video_to_youtube(user:User,upload_request:VideoUpLoadRequest)->
                 'selfDeclaredMadeForKids': False
             }
         }
-        video_stream = await download_video_media_from_cloud(upload_request.media_id)
-        
-        if video_stream is None:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Video media not found"
+        async with open_video_media_stream(upload_request.media_id) as media_response:
+            if media_response is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Video media not found"
+                )
+            # The upload needs the size up front; the body is only read into memory when it can't be trusted
+            video_size, buffer = await get_media_stream_size(media_response)
+            if video_size == 0:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Video media is empty"
+                )
+            auth_header = {"Authorization": f"Bearer {credentials.token}"}
+            # Start a resumable upload session; its URL comes back in the Location header
+            init_response = await _youtube_create_request(
+                "POST",
+                _YOUTUBE_UPLOAD_URL,
+                params={"uploadType": "resumable", "part": ",".join(body.keys())},
+                headers={
+                    **auth_header,
+                    "X-Upload-Content-Length": str(video_size),
+                    "X-Upload-Content-Type": "video/mp4",
+                    "Content-Type": "application/json; charset=UTF-8"
+                },
+                content=orjson.dumps(body)
             )
-        if len(video_stream.getvalue()) == 0:
+            if init_response.status_code != 200 or "location" not in init_response.headers:
+                raise _upload_error(init_response, f"Failed to initialize YouTube upload: {init_response.text}")
+            upload_url = init_response.headers["location"]
+
+            # Stream straight from cloud storage when the size was known, holding about one chunk at a time
+            chunks = iter_media_stream_chunks(media_response, buffer, _UPLOAD_CHUNK_SIZE)
+            response = await _upload_resumable(upload_url, auth_header, chunks, video_size)
+        if not response:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Video media is empty"
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Video upload failed, no video returned"
             )
-        media = MediaIoBaseUpload(
-            video_stream,
-            chunksize=1024 * 1024,  # 1 MB chunks
-            resumable=True,
-            mimetype='video/mp4'
-        )
-        insert_request = youtube_service.videos().insert(
-            part=','.join(body.keys()),
-            body=body,
-            media_body=media
-        )
-        response= insert_request.execute()
         video_id =response['id']
         social_video_data = SocialVideoCreate(
             user_id=str(user.id),
@@ -62,6 +285,7 @@ async def upload_video_to_youtube(user:User,upload_request:VideoUpLoadRequest)->
         await add_social_video(social_video_data)
         return f'https://www.youtube.com/watch?v={video_id}'
     except Exception as e:
+        _forget_youtube_service(user, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to upload video to YouTube: {str(e)}"
@@ -71,9 +295,10 @@ async def get_youtube_video_stats(user:User,video_id:str)->GoogleVideoStatsRespo
         youtube_service = await get_youtube_service(user)
         request =youtube_service.videos().list(
             part='statistics,snippet',
-            id=video_id
+            id=video_id,
+            fields=_VIDEO_STATS_FIELDS
         )
-        response = request.execute()
+        response = await _execute(request)
         if not response['items']:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -93,6 +318,7 @@ async def get_youtube_video_stats(user:User,video_id:str)->GoogleVideoStatsRespo
             created_at=snippet.get('publishedAt')
         )
     except Exception as e:
+        _forget_youtube_service(user, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get YouTube video stats: {str(e)}"
@@ -104,10 +330,10 @@ async def get_top_youtube_videos_by_views_and_date(user: User, start_date: datet
         youtube_service = await get_youtube_service(user)
 
         # Lấy uploads playlist ID
-        channels_response = youtube_service.channels().list(
+        channels_response = await _execute(youtube_service.channels().list(
             part="contentDetails",
             mine=True
-        ).execute()
+        ))
 
         if not channels_response['items']:
             raise HTTPException(status_code=404, detail="YouTube channel not found")
@@ -117,15 +343,17 @@ async def get_top_youtube_videos_by_views_and_date(user: User, start_date: datet
         video_infos = []
         next_page_token = None
 
-        # Duyệt hết các video trong uploads playlist
+        # Duyệt uploads playlist (mới nhất trước), dừng khi đã qua start_date
         while True:
-            playlist_response = youtube_service.playlistItems().list(
+            playlist_response = await _execute(youtube_service.playlistItems().list(
                 part="snippet",
                 playlistId=uploads_playlist_id,
                 maxResults=50,
-                pageToken=next_page_token
-            ).execute()
+                pageToken=next_page_token,
+                fields="nextPageToken,items/snippet(publishedAt,resourceId/videoId)"
+            ))
 
+            reached_older = False
             for item in playlist_response['items']:
                 published_at_str = item['snippet']['publishedAt']
                 published_at = datetime.fromisoformat(published_at_str.replace("Z", "+00:00"))
@@ -135,25 +363,31 @@ async def get_top_youtube_videos_by_views_and_date(user: User, start_date: datet
                         'id': item['snippet']['resourceId']['videoId'],
                         'publishedAt': published_at
                     })
+                elif published_at < start_date:
+                    reached_older = True
 
             next_page_token = playlist_response.get('nextPageToken')
-            if not next_page_token:
+            # The rest of the playlist is older still; finish this page but don't fetch more
+            if not next_page_token or reached_older:
                 break
 
         if not video_infos:
             return []
 
-        # Lấy statistics theo batch 50 video/lần
-        all_video_stats = []
-        for i in range(0, len(video_infos), 50):
-            batch_infos = video_infos[i:i+50]
-            batch_ids = [v['id'] for v in batch_infos]
+        # Lấy statistics theo batch 50 video/lần, các batch chạy song song
+        async def fetch_batch(batch_ids: List[str]) -> dict:
+            async with _YOUTUBE_LIST_CONCURRENCY:
+                return await _execute(youtube_service.videos().list(
+                    part="statistics,snippet",
+                    id=",".join(batch_ids),
+                    fields=_TOP_VIDEO_FIELDS
+                ))
 
-            videos_response = youtube_service.videos().list(
-                part="statistics,snippet",
-                id=",".join(batch_ids)
-            ).execute()
+        batches = [[v['id'] for v in video_infos[i:i+50]] for i in range(0, len(video_infos), 50)]
+        videos_responses = await asyncio.gather(*(fetch_batch(batch_ids) for batch_ids in batches))
 
+        all_video_stats = []
+        for videos_response in videos_responses:
             for video in videos_response['items']:
                 stats = video['statistics']
                 snippet = video['snippet']
@@ -164,10 +398,10 @@ async def get_top_youtube_videos_by_views_and_date(user: User, start_date: datet
                         "count": int(stats.get(f'{type_sta}Count', 0)),
                     }
                 )
-        all_video_stats.sort(key=lambda v: v['count'], reverse=True)
-        return all_video_stats[:max_results]
+        return heapq.nlargest(max_results, all_video_stats, key=lambda v: v['count'])
 
     except Exception as e:
+        _forget_youtube_service(user, e)
         raise HTTPException(status_code=500, detail=f"Failed to get top YouTube videos: {str(e)}")
 
 
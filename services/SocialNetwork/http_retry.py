@@ -0,0 +1,36 @@
+import httpx
+from tenacity import retry, retry_if_exception_type, retry_if_result, stop_after_attempt, wait_random_exponential
+
+# Responses worth another try: rate limiting and transient server errors
+_RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+_MAX_RETRY_WAIT_SECONDS = 30.0
+_backoff = wait_random_exponential(min=1, max=_MAX_RETRY_WAIT_SECONDS)
+
+def _wait_retry_after(retry_state) -> float:
+    """Wait as long as the response's Retry-After asks, otherwise back off exponentially"""
+    outcome = retry_state.outcome
+    if not outcome.failed:
+        retry_after = outcome.result().headers.get("retry-after", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), _MAX_RETRY_WAIT_SECONDS)
+    return _backoff(retry_state)
+
+def _retry_http(statuses: frozenset, exception_types: tuple):
+    """Retry an async httpx call that returns a response; once attempts run out the last response
+    is returned as-is so callers keep their own status handling"""
+    return retry(
+        stop=stop_after_attempt(4),
+        wait=_wait_retry_after,
+        retry=(
+            retry_if_result(lambda response: response.status_code in statuses)
+            | retry_if_exception_type(exception_types)
+        ),
+        retry_error_callback=lambda retry_state: retry_state.outcome.result(),
+    )
+
+# For idempotent and read-only calls: rate limiting, transient server errors and any transport failure
+retry_transient_http = _retry_http(_RETRY_STATUSES, (httpx.TransportError,))
+
+# For calls that create something (upload sessions): a 5xx or read timeout may come after the server
+# already acted, so only retry when the request certainly wasn't processed
+retry_rate_limited_http = _retry_http(frozenset((429,)), (httpx.ConnectError,))
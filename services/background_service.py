@@ -1,9 +1,8 @@
 from typing import List, Dict, Optional
-import os
 from services.Media.text_to_image import generate_image
 from services.Media.media_utils import upload_media
-from config import TEMP_DIR
-from uuid import uuid4
+import asyncio
+from collections import defaultdict
 
 # Background data mapping from frontend mockdata
 AVAILABLE_BACKGROUNDS = [
@@ -93,91 +92,69 @@ AVAILABLE_BACKGROUNDS = [
     }
 ]
 
+def _background_entry(bg: Dict) -> Dict:
+    """Build the API representation of a predefined background"""
+    return {
+        "id": bg["id"],
+        "title": bg["title"],
+        "category": bg["category"],
+        "image_url": f"/assets/images/backgrounds/{bg['id']}.jpg",
+        "thumbnail_url": f"/assets/images/backgrounds/thumbnails/{bg['id']}_thumb.jpg",
+        "tags": bg["tags"],
+        "premium": bg["premium"],
+        "available": True
+    }
+
+# AVAILABLE_BACKGROUNDS never changes at runtime, so build the entries and lookups once
+_ALL_BACKGROUNDS = tuple(_background_entry(bg) for bg in AVAILABLE_BACKGROUNDS)
+_BACKGROUNDS_BY_ID = {bg["id"]: bg for bg in _ALL_BACKGROUNDS}
+_BACKGROUNDS_BY_CATEGORY: Dict[str, List[Dict]] = defaultdict(list)
+for _bg in _ALL_BACKGROUNDS:
+    _BACKGROUNDS_BY_CATEGORY[_bg["category"].lower()].append(_bg)
+_FREE_BACKGROUNDS = tuple(bg for bg in _ALL_BACKGROUNDS if not bg["premium"])
+_PREMIUM_BACKGROUNDS = tuple(bg for bg in _ALL_BACKGROUNDS if bg["premium"])
+_BACKGROUND_CATEGORIES = tuple(sorted({bg["category"] for bg in _ALL_BACKGROUNDS}))
+# Lowercased search text (title, category and tags; NUL-separated so a query can't match across fields)
+# and lowercased tag sets, so queries only lowercase their own terms
+_SEARCH_INDEX = tuple(
+    ("\0".join([bg["title"], bg["category"], *bg["tags"]]).lower(), bg) for bg in _ALL_BACKGROUNDS
+)
+_TAG_INDEX = tuple((frozenset(tag.lower() for tag in bg["tags"]), bg) for bg in _ALL_BACKGROUNDS)
+
 def get_all_backgrounds() -> List[Dict]:
     """Get all available backgrounds"""
-    return [
-        {
-            "id": bg["id"],
-            "title": bg["title"],
-            "category": bg["category"],
-            "image_url": f"/assets/images/backgrounds/{bg['id']}.jpg",
-            "thumbnail_url": f"/assets/images/backgrounds/thumbnails/{bg['id']}_thumb.jpg",
-            "tags": bg["tags"],
-            "premium": bg["premium"],
-            "available": True
-        }
-        for bg in AVAILABLE_BACKGROUNDS
-    ]
+    return list(_ALL_BACKGROUNDS)
 
 def get_background_by_id(background_id: str) -> Optional[Dict]:
     """Get background by ID"""
-    for bg in AVAILABLE_BACKGROUNDS:
-        if bg["id"] == background_id:
-            return {
-                "id": bg["id"],
-                "title": bg["title"],
-                "category": bg["category"],
-                "image_url": f"/assets/images/backgrounds/{bg['id']}.jpg",
-                "thumbnail_url": f"/assets/images/backgrounds/thumbnails/{bg['id']}_thumb.jpg",
-                "tags": bg["tags"],
-                "premium": bg["premium"],
-                "available": True
-            }
-    return None
+    return _BACKGROUNDS_BY_ID.get(background_id)
 
 def get_backgrounds_by_category(category: str) -> List[Dict]:
     """Get backgrounds filtered by category"""
-    return [
-        bg for bg in get_all_backgrounds()
-        if bg["category"].lower() == category.lower()
-    ]
+    return list(_BACKGROUNDS_BY_CATEGORY.get(category.lower(), ()))
 
 def get_backgrounds_by_tags(tags: List[str]) -> List[Dict]:
     """Get backgrounds filtered by tags"""
-    filtered_backgrounds = []
-    for bg in get_all_backgrounds():
-        # Check if any of the provided tags match the background tags
-        if any(tag.lower() in [bt.lower() for bt in bg["tags"]] for tag in tags):
-            filtered_backgrounds.append(bg)
-    return filtered_backgrounds
+    # Match backgrounds having any of the provided tags
+    query_tags = {tag.lower() for tag in tags}
+    return [bg for bg_tags, bg in _TAG_INDEX if not bg_tags.isdisjoint(query_tags)]
 
 def get_free_backgrounds() -> List[Dict]:
     """Get only free backgrounds"""
-    return [bg for bg in get_all_backgrounds() if not bg["premium"]]
+    return list(_FREE_BACKGROUNDS)
 
 def get_premium_backgrounds() -> List[Dict]:
     """Get only premium backgrounds"""
-    return [bg for bg in get_all_backgrounds() if bg["premium"]]
+    return list(_PREMIUM_BACKGROUNDS)
 
 def get_background_categories() -> List[str]:
     """Get list of available categories"""
-    categories = set()
-    for bg in AVAILABLE_BACKGROUNDS:
-        categories.add(bg["category"])
-    return sorted(list(categories))
+    return list(_BACKGROUND_CATEGORIES)
 
 def search_backgrounds(query: str) -> List[Dict]:
     """Search backgrounds by title, category, or tags"""
     query_lower = query.lower()
-    results = []
-    
-    for bg in get_all_backgrounds():
-        # Search in title
-        if query_lower in bg["title"].lower():
-            results.append(bg)
-            continue
-            
-        # Search in category
-        if query_lower in bg["category"].lower():
-            results.append(bg)
-            continue
-            
-        # Search in tags
-        if any(query_lower in tag.lower() for tag in bg["tags"]):
-            results.append(bg)
-            continue
-    
-    return results
+    return [bg for search_text, bg in _SEARCH_INDEX if query_lower in search_text]
 
 async def generate_custom_background(prompt: str, style: str = "realistic", resolution: str = "720x1280") -> Dict:
     """
@@ -198,19 +175,15 @@ async def generate_custom_background(prompt: str, style: str = "realistic", reso
         else:
             width, height = 720, 1280
         
-        # Generate image using existing service
-        output_file = os.path.join(TEMP_DIR, f"bg_custom_{uuid4()}.png")
-        
-        # Use Flux model for background generation
-        result_file = generate_image("flux", prompt, style, output_file, width, height)
+        # Use Flux model for background generation, keeping the image in memory for the upload
+        image_data = await generate_image("flux", prompt, style, None, width, height)
         
-        if not result_file or not os.path.exists(result_file):
+        if not image_data:
             raise Exception("Failed to generate background image")
         
-        # Upload to Cloudinary using await (now that this is an async function)
         try:
             upload_result = await upload_media(
-                result_file,
+                image_data,
                 "system",  # System user for generated backgrounds
                 folder="backgrounds",
                 resource_type="image",
@@ -224,10 +197,6 @@ async def generate_custom_background(prompt: str, style: str = "realistic", reso
             
             print(f"Upload result: {upload_result}")  # Debug logging
             
-            # Clean up local file
-            if os.path.exists(result_file):
-                os.remove(result_file)
-            
             # Use the actual database ID from upload_media
             background_id = upload_result["id"]
             
@@ -249,14 +218,26 @@ async def generate_custom_background(prompt: str, style: str = "realistic", reso
             
         except Exception as upload_error:
             print(f"Upload error details: {upload_error}")  # Debug logging
-            # If upload fails, clean up the file and reraise
-            if os.path.exists(result_file):
-                os.remove(result_file)
             raise Exception(f"Failed to upload background to cloud: {str(upload_error)}")
         
     except Exception as e:
         raise Exception(f"Background generation failed: {str(e)}")
 
+# Custom backgrounds generated at once per request (each is an image generation plus an upload)
+_BACKGROUND_GENERATION_CONCURRENCY = 4
+
+async def _generate_backgrounds(prompts: List[str], style: str) -> List:
+    """Generate a background per prompt concurrently; failures come back as exceptions, in prompt order"""
+    semaphore = asyncio.Semaphore(_BACKGROUND_GENERATION_CONCURRENCY)
+
+    async def generate(prompt: str) -> Dict:
+        async with semaphore:
+            return await generate_custom_background(prompt=prompt, style=style, resolution="720x1280")
+
+    return await asyncio.gather(*(generate(prompt) for prompt in prompts), return_exceptions=True)
+
+_MAX_RECOMMENDATIONS = 8
+
 async def get_recommended_backgrounds(script_content: str = None, selected_voice: str = None, script_images: list = None) -> List[Dict]:
     """
     Get recommended backgrounds based on script content and generated image prompts
@@ -270,31 +251,36 @@ async def get_recommended_backgrounds(script_content: str = None, selected_voice
         List of recommended backgrounds
     """
     recommendations = []
+    seen = set()
+
+    def add_many(backgrounds) -> bool:
+        """Add backgrounds not recommended yet; True once the list is full"""
+        for bg in backgrounds:
+            if len(recommendations) >= _MAX_RECOMMENDATIONS:
+                return True
+            if bg["id"] not in seen:
+                seen.add(bg["id"])
+                recommendations.append(bg)
+        return len(recommendations) >= _MAX_RECOMMENDATIONS
     
     # If we have image prompts from script generation, create custom backgrounds
     if script_images and len(script_images) > 0:
         print(f"🎨 Generating backgrounds from {len(script_images)} image prompts...")
         
-        for i, image_prompt in enumerate(script_images[:3]):  # Limit to 3 custom backgrounds
-            try:
-                # Generate custom background from image prompt (now async)
-                custom_bg = await generate_custom_background(
-                    prompt=image_prompt,
-                    style="realistic",
-                    resolution="720x1280"
-                )
-                
-                # Update title to be more descriptive
-                custom_bg["title"] = f"Scene {i+1}: {image_prompt[:50]}{'...' if len(image_prompt) > 50 else ''}"
-                custom_bg["category"] = "Script Generated"
-                custom_bg["tags"].extend(["script-based", "ai-generated", f"scene-{i+1}"])
-                
-                recommendations.append(custom_bg)
-                print(f"✅ Generated background {i+1}: {custom_bg['title']}")
-                
-            except Exception as e:
-                print(f"❌ Failed to generate background {i+1}: {str(e)}")
+        prompts = script_images[:3]  # Limit to 3 custom backgrounds
+        results = await _generate_backgrounds(prompts, "realistic")
+        for i, (image_prompt, custom_bg) in enumerate(zip(prompts, results)):
+            if isinstance(custom_bg, Exception):
+                print(f"❌ Failed to generate background {i+1}: {str(custom_bg)}")
                 continue
+
+            # Update title to be more descriptive
+            custom_bg["title"] = f"Scene {i+1}: {image_prompt[:50]}{'...' if len(image_prompt) > 50 else ''}"
+            custom_bg["category"] = "Script Generated"
+            custom_bg["tags"].extend(["script-based", "ai-generated", f"scene-{i+1}"])
+
+            add_many([custom_bg])
+            print(f"✅ Generated background {i+1}: {custom_bg['title']}")
     
     # Add some default backgrounds based on script content analysis
     if script_content:
@@ -302,41 +288,30 @@ async def get_recommended_backgrounds(script_content: str = None, selected_voice
         
         # Business/Professional content
         if any(keyword in script_lower for keyword in ['business', 'professional', 'corporate', 'office', 'meeting']):
-            recommendations.extend(get_backgrounds_by_category("Workspace"))
+            if add_many(get_backgrounds_by_category("Workspace")):
+                return recommendations
         
         # Food/Cooking content (like sahur example)
         if any(keyword in script_lower for keyword in ['food', 'sahur', 'breakfast', 'meal', 'cooking', 'kitchen', 'recipe']):
             # Add kitchen and dining related backgrounds
-            kitchen_backgrounds = [bg for bg in get_all_backgrounds() if any(tag in bg["tags"] for tag in ["kitchen", "dining", "food", "cozy"])]
-            recommendations.extend(kitchen_backgrounds)
+            if add_many(get_backgrounds_by_tags(["kitchen", "dining", "food", "cozy"])):
+                return recommendations
         
         # Nature/Wellness content
         if any(keyword in script_lower for keyword in ['nature', 'health', 'wellness', 'meditation', 'peaceful', 'morning']):
-            recommendations.extend(get_backgrounds_by_category("Nature"))
+            if add_many(get_backgrounds_by_category("Nature")):
+                return recommendations
         
         # Technology/Modern content
         if any(keyword in script_lower for keyword in ['technology', 'digital', 'modern', 'innovation', 'future']):
-            recommendations.extend(get_backgrounds_by_category("Abstract"))
-            recommendations.extend(get_backgrounds_by_category("City"))
-    
-    # Remove duplicates while preserving order
-    seen = set()
-    unique_recommendations = []
-    for bg in recommendations:
-        if bg["id"] not in seen:
-            seen.add(bg["id"])
-            unique_recommendations.append(bg)
+            if add_many(get_backgrounds_by_category("Abstract")) or add_many(get_backgrounds_by_category("City")):
+                return recommendations
     
     # If not enough recommendations, add some defaults
-    if len(unique_recommendations) < 6:
-        for bg in get_all_backgrounds():
-            if len(unique_recommendations) >= 8:
-                break
-            if bg["id"] not in seen:
-                unique_recommendations.append(bg)
-                seen.add(bg["id"])
+    if len(recommendations) < 6:
+        add_many(_ALL_BACKGROUNDS)
     
-    return unique_recommendations[:8]
+    return recommendations
 
 async def generate_backgrounds_from_script_images(script_images: list, style: str = "realistic") -> List[Dict]:
     """
@@ -351,31 +326,24 @@ async def generate_backgrounds_from_script_images(script_images: list, style: st
     """
     generated_backgrounds = []
     
-    for i, image_prompt in enumerate(script_images):
-        try:
-            print(f"🎨 Generating background {i+1}/{len(script_images)}: {image_prompt[:50]}...")
-            
-            # Generate background (now async)
-            background = await generate_custom_background(
-                prompt=image_prompt,
-                style=style,
-                resolution="720x1280"
-            )
-            
-            # Enhance metadata
-            background.update({
-                "title": f"Script Scene {i+1}",
-                "category": "Script Generated",
-                "tags": ["script-based", "auto-generated", f"scene-{i+1}", style],
-                "script_prompt": image_prompt,
-                "scene_number": i + 1
-            })
-            
-            generated_backgrounds.append(background)
-            print(f"✅ Background {i+1} generated successfully")
-            
-        except Exception as e:
-            print(f"❌ Failed to generate background {i+1}: {str(e)}")
+    print(f"🎨 Generating {len(script_images)} backgrounds...")
+    results = await _generate_backgrounds(script_images, style)
+
+    for i, (image_prompt, background) in enumerate(zip(script_images, results)):
+        if isinstance(background, Exception):
+            print(f"❌ Failed to generate background {i+1}: {str(background)}")
             continue
+
+        # Enhance metadata
+        background.update({
+            "title": f"Script Scene {i+1}",
+            "category": "Script Generated",
+            "tags": ["script-based", "auto-generated", f"scene-{i+1}", style],
+            "script_prompt": image_prompt,
+            "scene_number": i + 1
+        })
+        
+        generated_backgrounds.append(background)
+        print(f"✅ Background {i+1} generated successfully")
     
     return generated_backgrounds
@@ -180,7 +180,7 @@ def format_time_for_srt(seconds: float) -> str:
 
 SUPPORTED_LANGUAGES = ["en", "vi", "es", "fr", "de", "ja", "ko", "zh"]
 
-def generate_subtitles_from_audio(audio_file_path: str, language: str = "auto", max_words_per_segment: int = 5) -> Dict:
+async def generate_subtitles_from_audio(audio_file_path: str, language: str = "auto", max_words_per_segment: int = 5) -> Dict:
     """
     Generate subtitles from audio file with automatic language detection
     
@@ -207,7 +207,7 @@ def generate_subtitles_from_audio(audio_file_path: str, language: str = "auto",
             actual_language = None  # Pass None to enable auto-detection
         
         # Transcribe audio and generate SRT
-        transcription_text = transcribe_audio(audio_file_path, srt_file, actual_language)
+        transcription_text = await transcribe_audio(audio_file_path, srt_file, actual_language)
         
         if not transcription_text or not os.path.exists(srt_file):
             raise Exception("No transcription data received or SRT file not created")
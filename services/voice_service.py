@@ -1,6 +1,6 @@
 from typing import List, Dict, Optional
 import os
-from services.Media.text_to_speech import generate_speech
+from services.Media.text_to_speech import generate_speech, AVAILABLE_VOICES as GEMINI_VOICES
 from config import TEMP_DIR
 from uuid import uuid4
 
@@ -113,6 +113,11 @@ AVAILABLE_VOICES = [
     }
 ]
 
+# Catch voice mapping typos at startup rather than on the first TTS request
+_unknown_voices = [voice["id"] for voice in AVAILABLE_VOICES if voice["gemini_voice"] not in GEMINI_VOICES]
+if _unknown_voices:
+    raise ValueError(f"Voices mapped to unsupported Gemini voices: {_unknown_voices}")
+
 def get_all_voices() -> List[Dict]:
     """Get all available voices"""
     return [
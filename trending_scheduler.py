@@ -2,13 +2,13 @@
 Background scheduler to automatically fetch trending topics from internet
 Run this as a background service or cron job
 """
-import asyncio
 import schedule
 import time
 import logging
 from datetime import datetime
 from services.trending_topics import fetch_and_update_internet_trends
 from config.mongodb_config import test_connection
+from core.event_loop import run_async
 
 # Configure logging
 logging.basicConfig(
@@ -45,7 +45,7 @@ async def update_trends_job():
 
 def run_async_job():
     """Wrapper to run async job in sync context"""
-    asyncio.run(update_trends_job())
+    run_async(update_trends_job())
 
 def setup_scheduler():
     """Setup the scheduler for automatic trend updates"""
@@ -9,6 +9,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from services.background_service import upload_image_to_cloudinary, AVAILABLE_BACKGROUNDS
 from services.Media.text_to_image import generate_image
 from config import TEMP_DIR
+from core.event_loop import run_async
 from uuid import uuid4
 
 def generate_and_upload_preset_backgrounds():
@@ -49,7 +50,7 @@ def generate_and_upload_preset_backgrounds():
             output_file = os.path.join(TEMP_DIR, f"{bg_id}_background.png")
             print(f"   🖼️ Generating image...")
             
-            result_file = generate_image("flux", enhanced_prompt, None, output_file)
+            result_file = run_async(generate_image("flux", enhanced_prompt, None, output_file))
             
             if result_file and os.path.exists(result_file):
                 # Upload to Cloudinary
@@ -91,7 +92,7 @@ def generate_demo_backgrounds():
             print(f"\n🎯 Generating demo background {i}/3...")
             
             output_file = os.path.join(TEMP_DIR, f"demo_bg_{i}.png")
-            result_file = generate_image("flux", prompt, None, output_file)
+            result_file = run_async(generate_image("flux", prompt, None, output_file))
             
             if result_file and os.path.exists(result_file):
                 public_url = upload_image_to_cloudinary(result_file, "backgrounds/demo")